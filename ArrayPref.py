@@ -0,0 +1,334 @@
+#!python3
+
+from collections import OrderedDict
+import numpy as np
+from Pref import Pref, RankMask
+
+
+def sortedBordas(bordas:np.ndarray, bundles)->np.ndarray:
+	"""
+	bordas:  an array that maps each item id to its Borda score.
+	bundles: an integer array of item ids; the last axis enumerates the items of a bundle.
+
+	return the Borda scores of the items of each bundle, in decreasing order along the last axis.
+
+	>>> sortedBordas(np.array([3,1,2]), [1,0,2])
+	array([3, 2, 1])
+	"""
+	return -np.sort(-bordas[np.asarray(bundles, dtype=np.intp)], axis=-1)
+
+
+def necessarilyWeaklyBetter(bordas1:np.ndarray, bordas2:np.ndarray):
+	"""
+	bordas1, bordas2: arrays of Borda scores sorted in decreasing order along the last axis.
+
+	return True where bundle1 >= bundle2 necessarily.
+
+	>>> necessarilyWeaklyBetter(np.array([[6,4,2],[6,4,1]]), np.array([5,3,2]))
+	array([ True, False])
+	"""
+	if bordas1.shape[-1] < bordas2.shape[-1]:
+		return _constant(bordas1, bordas2, False)
+	return np.all(bordas1[..., :bordas2.shape[-1]] >= bordas2, axis=-1)
+
+
+def nddWeaklyBetter(bordas1:np.ndarray, bordas2:np.ndarray):
+	"""
+	bordas1, bordas2: arrays of Borda scores sorted in decreasing order along the last axis.
+
+	return True where bundle1 >= bundle2 necessarily under the Diminishing Differences assumption.
+
+	>>> nddWeaklyBetter(np.array([[6,4,1],[5,4,3]]), np.array([[5,3,2],[6,2,1]]))
+	array([ True, False])
+	"""
+	return necessarilyWeaklyBetter(np.cumsum(bordas1, axis=-1), np.cumsum(bordas2, axis=-1))
+
+
+def possiblyWeaklyBetter(bordas1:np.ndarray, bordas2:np.ndarray):
+	"""
+	bordas1, bordas2: arrays of Borda scores sorted in decreasing order along the last axis.
+
+	return True where bundle1 >= bundle2 possibly.
+
+	>>> possiblyWeaklyBetter(np.array([[5,4,3],[5,3,1]]), np.array([[6,2,1],[5,3,2]]))
+	array([ True, False])
+	"""
+	if bordas1.shape[-1] > bordas2.shape[-1]:
+		return _constant(bordas1, bordas2, True)
+	diffs = bordas1 - bordas2[..., :bordas1.shape[-1]]
+	return np.any(diffs > 0, axis=-1) | np.all(diffs == 0, axis=-1)
+
+
+def pddWeaklyBetter(bordas1:np.ndarray, bordas2:np.ndarray):
+	"""
+	bordas1, bordas2: arrays of Borda scores sorted in decreasing order along the last axis.
+
+	return True where bundle1 >= bundle2 possibly under the Diminishing Differences assumption.
+
+	>>> pddWeaklyBetter(np.array([[5,4,3],[5,3,1]]), np.array([[6,2,1],[5,3,2]]))
+	array([ True, False])
+	"""
+	return possiblyWeaklyBetter(np.cumsum(bordas1, axis=-1), np.cumsum(bordas2, axis=-1))
+
+
+def _constant(bordas1:np.ndarray, bordas2:np.ndarray, value:bool):
+	shape = np.broadcast_shapes(bordas1.shape[:-1], bordas2.shape[:-1])
+	return np.full(shape, value) if shape else value
+
+
+
+class ArrayPref(Pref):
+	"""
+	An array-backed version of Pref.
+	The items are the dense integer ids 0,...,m-1.
+	The ranking, the Borda scores and the values are kept in contiguous NumPy arrays indexed by item id
+	(or by rank), so comparing bundles involves no dict lookups.
+	The attributes ordinal, cardinal and borda of Pref are available as read-only views.
+	"""
+
+	__slots__ = ("order", "rank", "bordas", "values", "removed", "cursor")
+
+	def __init__(self, order=None, values=None):
+		"""
+		values: an array that maps each item id to its value. If it is given, it will also determine the ranking.
+
+		order:  an array of all item ids, from best to worst. Will be used only if values is not given.
+
+		>>> p = ArrayPref(values=[6.2, 1.3, 3.4])
+		>>> p
+		cardinal=0:6.2 2:3.4 1:1.3 ordinal=0>2>1
+		>>> p.bordas
+		array([3, 1, 2])
+		>>> p.borda
+		{0: 3, 2: 2, 1: 1}
+		>>> ArrayPref(order=[2,0,1]).ordinal
+		[2, 0, 1]
+		"""
+		if values is not None:
+			self.values = np.asarray(values, dtype=float)
+			# Sort items by decreasing value:
+			self.order = np.argsort(-self.values, kind="stable")
+		else:
+			self.values = None
+			self.order = np.asarray(order, dtype=np.intp)
+		itemCount = len(self.order)
+		self.rank = np.empty(itemCount, dtype=np.intp)
+		self.rank[self.order] = np.arange(itemCount)
+		self.bordas = itemCount - self.rank
+		self.removed = np.zeros(itemCount, dtype=bool)
+		self.cursor = 0   # all ranks before the cursor are removed items
+
+	@staticmethod
+	def fromPref(pref:Pref, items:list=None):
+		"""
+		Convert a Pref to an ArrayPref.
+
+		items: the item labels; the id of each item is its index in this list. Default: the sorted items of pref.
+
+		>>> ArrayPref.fromPref(Pref(cardinal={"x": 6.2, "y": 1.3, "z": 3.4}))
+		cardinal=0:6.2 2:3.4 1:1.3 ordinal=0>2>1
+		>>> ArrayPref.fromPref(Pref(ordinal=["y","x","z"]), items=["x","y","z"])
+		 ordinal=1>0>2
+		"""
+		if items is None:
+			items = sorted(pref.ordinal)
+		itemIds = {item: id for (id, item) in enumerate(items)}
+		if pref.cardinal is not None:
+			values = np.empty(len(items))
+			for (item, value) in pref.cardinal.items():
+				values[itemIds[item]] = value
+			return ArrayPref(values=values)
+		return ArrayPref(order=[itemIds[item] for item in pref.ordinal])
+
+	@property
+	def ordinal(self)->list:
+		return [int(item) for item in self.order[~self.removed[self.order]]]
+
+	@property
+	def cardinal(self)->OrderedDict:
+		if self.values is None:
+			return None
+		return OrderedDict((item, float(self.values[item])) for item in self.ordinal)
+
+	@property
+	def borda(self)->dict:
+		return {int(item): int(self.bordas[item]) for item in self.order}
+
+	def bestItem(self):
+		"""
+			return the best item that was not removed.
+			Removed items are skipped by advancing a cursor, so the amortized time is O(1).
+
+			>>> p = ArrayPref(order=[2,0,1])
+			>>> p.removeItem(2)
+			>>> p.bestItem()
+			0
+			>>> p.removeItem(1)
+			>>> p.bestItem()
+			0
+			>>> p.ordinal
+			[0]
+		"""
+		order = self.order
+		cursor = self.cursor
+		while cursor < len(order) and self.removed[order[cursor]]:
+			cursor += 1
+		self.cursor = cursor
+		if cursor == len(order):
+			raise ValueError("No items left in ArrayPref(" + self.__repr__() + ")")
+		return int(order[cursor])
+
+	def removeItem(self, item):
+		"""
+			Mark the given item as removed. Takes O(1) time.
+		"""
+		if 0 <= item < len(self.removed) and not self.removed[item]:
+			self.removed[item] = True
+		else:
+			raise ValueError("Item "+str(item)+" not found in ArrayPref("+self.__repr__()+")")
+
+	def valueOf(self, bundle):
+		"""
+			return the sum of values of the items in the given bundle.
+
+			>>> p = ArrayPref(values=[6.2, 1.3, 3.4])
+			>>> p.valueOf([0,1])
+			7.5
+		"""
+		if self.values is None:
+			raise ValueError("Cannot evaluate items since I have no cardinal-value information")
+		return float(self.values[np.asarray(bundle, dtype=np.intp)].sum())
+
+	def bordasOf(self, bundle)->np.ndarray:
+		"""
+			return an array of the Borda scores of the items in the given bundle, in decreasing order.
+
+			>>> ArrayPref(order=[5,4,3,2,1,0]).bordasOf([3,5,1])
+			array([6, 4, 2])
+			>>> ArrayPref(order=[5,4,3,2,1,0]).bordasOf(RankMask(0b10101))
+			array([6, 4, 2])
+		"""
+		if isinstance(bundle, RankMask):
+			return np.array(bundle.bordas(len(self.bordas)))
+		return sortedBordas(self.bordas, bundle)
+
+	def rankMaskOf(self, bundle)->RankMask:
+		"""
+			>>> bin(ArrayPref(order=[5,4,3,2,1,0]).rankMaskOf([3,5,1]))
+			'0b10101'
+		"""
+		bits = 0
+		for rank in self.rank[np.asarray(bundle, dtype=np.intp)]:
+			bits |= 1 << int(rank)
+		return RankMask(bits)
+
+	def isDiminishingDifferences(self):
+		"""
+			>>> ArrayPref(values=[6.2, 1.3, 3.4]).isDiminishingDifferences()
+			True
+			>>> ArrayPref(values=[6.2, 0.3, 3.4]).isDiminishingDifferences()
+			False
+		"""
+		values = self.values[self.order[~self.removed[self.order]]]
+		return bool(np.all(np.diff(values, n=2) >= 0))
+
+	def isNecessarilyWeaklyBetter(self, bundle1, bundle2):
+		"""
+		>>> pref = ArrayPref(order=[5,4,3,2,1,0])
+		>>> pref.isNecessarilyWeaklyBetter([5,3,1],[4,2,0])
+		True
+		>>> pref.isNecessarilyWeaklyBetter([5,3,0],[4,2,1])
+		False
+		"""
+		return bool(necessarilyWeaklyBetter(self.bordasOf(bundle1), self.bordasOf(bundle2)))
+
+	def isNDDWeaklyBetter(self, bundle1, bundle2):
+		"""
+		>>> pref = ArrayPref(order=[5,4,3,2,1,0])
+		>>> pref.isNDDWeaklyBetter([5,3,0],[4,2,1])
+		True
+		>>> pref.isNDDWeaklyBetter([4,3,2],[5,1,0])
+		False
+		"""
+		return bool(nddWeaklyBetter(self.bordasOf(bundle1), self.bordasOf(bundle2)))
+
+	def isPossiblyWeaklyBetter(self, bundle1, bundle2):
+		"""
+		>>> pref = ArrayPref(order=[5,4,3,2,1,0])
+		>>> pref.isPossiblyWeaklyBetter([4,3,2],[5,1,0])
+		True
+		>>> pref.isPossiblyWeaklyBetter([4,2,0],[4,2,1])
+		False
+		"""
+		return bool(possiblyWeaklyBetter(self.bordasOf(bundle1), self.bordasOf(bundle2)))
+
+	def isPDDWeaklyBetter(self, bundle1, bundle2):
+		"""
+		>>> pref = ArrayPref(order=[5,4,3,2,1,0])
+		>>> pref.isPDDWeaklyBetter([4,3,2],[5,1,0])
+		True
+		>>> pref.isPDDWeaklyBetter([4,2,0],[4,2,1])
+		False
+		"""
+		return bool(pddWeaklyBetter(self.bordasOf(bundle1), self.bordasOf(bundle2)))
+
+
+	### Batch variants: each compares many pairs of bundles in one vectorized call.
+	# bundles1, bundles2: integer arrays of item ids of shape (count, bundleSize).
+	# Either of them may also be a single bundle (a 1-D array), which is then compared to every bundle of the other.
+
+	def bordasOfBatch(self, bundles)->np.ndarray:
+		"""
+			return an array with the Borda scores of each bundle (row) in decreasing order.
+
+			>>> ArrayPref(order=[5,4,3,2,1,0]).bordasOfBatch([[3,5,1],[0,1,2]])
+			array([[6, 4, 2],
+			       [3, 2, 1]])
+		"""
+		return sortedBordas(self.bordas, bundles)
+
+	def isNecessarilyWeaklyBetterBatch(self, bundles1, bundles2)->np.ndarray:
+		"""
+		>>> pref = ArrayPref(order=[5,4,3,2,1,0])
+		>>> pref.isNecessarilyWeaklyBetterBatch([[5,3,1],[5,3,0],[4,2,1]], [4,2,1])
+		array([ True, False,  True])
+		>>> pref.isNecessarilyWeaklyBetterBatch([[5,3,1],[5,3,0]], [[4,2,0],[4,2,1]])
+		array([ True, False])
+		"""
+		return self._compareBatch(necessarilyWeaklyBetter, bundles1, bundles2)
+
+	def isNDDWeaklyBetterBatch(self, bundles1, bundles2)->np.ndarray:
+		"""
+		>>> pref = ArrayPref(order=[5,4,3,2,1,0])
+		>>> pref.isNDDWeaklyBetterBatch([[5,3,0],[4,3,2]], [[4,2,1],[5,1,0]])
+		array([ True, False])
+		"""
+		return self._compareBatch(nddWeaklyBetter, bundles1, bundles2)
+
+	def isPossiblyWeaklyBetterBatch(self, bundles1, bundles2)->np.ndarray:
+		"""
+		>>> pref = ArrayPref(order=[5,4,3,2,1,0])
+		>>> pref.isPossiblyWeaklyBetterBatch([[4,3,2],[4,2,0]], [[5,1,0],[4,2,1]])
+		array([ True, False])
+		"""
+		return self._compareBatch(possiblyWeaklyBetter, bundles1, bundles2)
+
+	def isPDDWeaklyBetterBatch(self, bundles1, bundles2)->np.ndarray:
+		"""
+		>>> pref = ArrayPref(order=[5,4,3,2,1,0])
+		>>> pref.isPDDWeaklyBetterBatch([[4,3,2],[4,2,0]], [[5,1,0],[4,2,1]])
+		array([ True, False])
+		"""
+		return self._compareBatch(pddWeaklyBetter, bundles1, bundles2)
+
+	def _compareBatch(self, relation, bundles1, bundles2)->np.ndarray:
+		bordas1 = self.bordasOfBatch(bundles1)
+		bordas2 = self.bordasOfBatch(bundles2)
+		if bordas1.ndim == 1 and bordas2.ndim == 1:
+			raise ValueError("At least one of the arguments should be a 2-D array of bundles")
+		return np.asarray(relation(bordas1, bordas2))
+
+
+if __name__ == "__main__":
+	import doctest
+	print(doctest.testmod())
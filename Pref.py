@@ -14,6 +14,8 @@ class Pref(object):
       Date:   2017-02
 	"""
 
+	__slots__ = ("cardinal", "ordinal", "borda")
+
 	def __init__(self, ordinal:list=None, cardinal:dict=None):
 		"""
 			cardinal: a dictionary that maps items to their values. If it is given, it will also determine the ranking.
@@ -74,9 +76,32 @@ class Pref(object):
 	def bordasOf(self, bundle):
 		"""
 			return a list of the Borda scores of the items in the given bundle, in decreasing order.
+			The bundle can also be a RankMask, in which case no sorting is needed.
+
+			>>> p = Pref(ordinal=[6,5,4,3,2,1])
+			>>> p.bordasOf([2,6,4])
+			[6, 4, 2]
+			>>> p.bordasOf(p.rankMaskOf([2,6,4]))
+			[6, 4, 2]
 		"""
+		if isinstance(bundle, RankMask):
+			return bundle.bordas(len(self.borda))
 		return sorted([self.borda[item] for item in bundle], reverse=True)
 
+	def rankMaskOf(self, bundle)->"RankMask":
+		"""
+			return the given bundle as a RankMask, where bit i is set iff the i-th ranked item is in the bundle.
+
+			>>> p = Pref(ordinal=[6,5,4,3,2,1])
+			>>> bin(p.rankMaskOf([2,6,4]))
+			'0b10101'
+		"""
+		itemCount = len(self.borda)
+		bits = 0
+		for item in bundle:
+			bits |= 1 << (itemCount - self.borda[item])
+		return RankMask(bits)
+
 	def isDiminishingDifferences(self):
 		"""
 			return true if the cardinal utilities satisfy the DD condition:
@@ -100,7 +125,7 @@ class Pref(object):
 	def isNecessarilyWeaklyBetter(self, bundle1, bundle2):
 		"""
 		INPUT:
-		bundle1, bundle2: lists of items.
+		bundle1, bundle2: lists of items, or RankMasks.
 
 		OUTPUT:
 		True iff bundle1 >= bundle2 necessarily, based on self.ordinal.
@@ -114,6 +139,8 @@ class Pref(object):
 		False
 		>>> pref.isNecessarilyWeaklyBetter([5,4,2],[5,4,2])
 		True
+		>>> pref.isNecessarilyWeaklyBetter(pref.rankMaskOf([6,4,2]), pref.rankMaskOf([5,3,1]))
+		True
 		"""
 		if len(bundle1) < len(bundle2):
 			return False
@@ -127,7 +154,7 @@ class Pref(object):
 	def isNDDWeaklyBetter(self, bundle1, bundle2):
 		"""
 		INPUT:
-		bundle1, bundle2: lists of items.
+		bundle1, bundle2: lists of items, or RankMasks.
 
 		OUTPUT:
 		True iff bundle1 >= bundle2 necessarily, based on self.ordinal and the Diminishing Differences assumption.
@@ -141,6 +168,8 @@ class Pref(object):
 		False
 		>>> pref.isNDDWeaklyBetter([5,4,2],[5,4,2])
 		True
+		>>> pref.isNDDWeaklyBetter(pref.rankMaskOf([6,4,1]), pref.rankMaskOf([5,3,2]))
+		True
 		"""
 		if len(bundle1) < len(bundle2):
 			return False
@@ -156,7 +185,7 @@ class Pref(object):
 	def isPossiblyWeaklyBetter(self, bundle1, bundle2):
 		"""
 		INPUT:
-		bundle1, bundle2: lists of items.
+		bundle1, bundle2: lists of items, or RankMasks.
 
 		OUTPUT:
 		True iff bundle1 >= bundle2 possibly, based on self.ordinal.
@@ -170,6 +199,8 @@ class Pref(object):
 		True
 		>>> pref.isPossiblyWeaklyBetter([5,3,1],[5,3,2])
 		False
+		>>> pref.isPossiblyWeaklyBetter(pref.rankMaskOf([5,4,3]), pref.rankMaskOf([6,2,1]))
+		True
 		"""
 		if len(bundle1) > len(bundle2):
 			return True
@@ -186,7 +217,7 @@ class Pref(object):
 	def isPDDWeaklyBetter(self, bundle1, bundle2):
 		"""
 		INPUT:
-		bundle1, bundle2: lists of items.
+		bundle1, bundle2: lists of items, or RankMasks.
 
 		OUTPUT:
 		True iff bundle1 >= bundle2 possibly, based on self.ordinal.
@@ -200,6 +231,8 @@ class Pref(object):
 		True
 		>>> pref.isPossiblyWeaklyBetter([5,3,1],[5,3,2])
 		False
+		>>> pref.isPDDWeaklyBetter(pref.rankMaskOf([5,3,1]), pref.rankMaskOf([5,3,2]))
+		False
 		"""
 		if len(bundle1) > len(bundle2):
 			return True
@@ -217,40 +250,108 @@ class Pref(object):
 
 
 	@staticmethod
-	def randomOrdinal(items):
-		return Pref(ordinal = list(np.random.permutation(items)))
+	def randomOrdinal(items, rng:np.random.Generator=None):
+		"""
+		items: a list of items.
+
+		rng: the random generator to use. If None, the global np.random state is used.
+
+		>>> Pref.randomOrdinal([1,2,3,4,5], rng=np.random.default_rng(1)).ordinal == Pref.randomOrdinal([1,2,3,4,5], rng=np.random.default_rng(1)).ordinal
+		True
+		"""
+		rng = np.random if rng is None else rng
+		return Pref(ordinal = list(rng.permutation(items)))
 
 	@staticmethod
-	def randomCardinal(marketValues, maxNoiseSize):
+	def randomCardinal(marketValues, maxNoiseSize, rng:np.random.Generator=None):
 		"""
 		marketValues: a dictionary that maps each item to its "market value".
 
 		maxNoiseSize: a number that represents the maximum difference between the market value and the agent's value.
 
+		rng: the random generator to use. If None, the global np.random state is used.
+
 		The agent's cardinal values for each item will be selected by adding a random noise in [-maxNoiseSize,maxNoiseSize] to the market value of the item.
 		"""
+		rng = np.random if rng is None else rng
 		cardinal = {}
 		for item in marketValues.items():
-			agentValue = item[1] + np.random.uniform(-maxNoiseSize, maxNoiseSize)
+			agentValue = item[1] + rng.uniform(-maxNoiseSize, maxNoiseSize)
 			cardinal[item[0]] = agentValue
 		return Pref(cardinal=cardinal)
 
 	@staticmethod
-	def randomCardinalGaussian(marketValues, stddev):
+	def randomCardinalGaussian(marketValues, stddev, rng:np.random.Generator=None):
 		"""
 		marketValues: a dictionary that maps each item to its "market value".
 
 		stddev: standard deviation of the distribution.
 
+		rng: the random generator to use. If None, the global np.random state is used.
+
 		The agent's cardinal values for each item will be selected by adding a random noise distributed like Normal(0,stddev) to the market value of the item.
 		"""
+		rng = np.random if rng is None else rng
 		cardinal = {}
 		for item in marketValues.items():
-			agentValue = np.random.normal(item[1], stddev)
+			agentValue = rng.normal(item[1], stddev)
 			cardinal[item[0]] = agentValue
 		return Pref(cardinal=cardinal)
 
 
+class RankMask(int):
+	"""
+	A bundle of a single agent, represented as an integer bitset over the agent's ranks:
+	bit i is set iff the agent's i-th ranked item (0 = best) is in the bundle.
+	Since the bits are scanned from the best rank downwards, the Borda scores come out already sorted.
+
+	copies: the number of times each item of the bundle is counted (e.g. for comparing a duplicated bundle to all items).
+
+	>>> m = RankMask(0b10101)
+	>>> len(m)
+	3
+	>>> m.bordas(6)
+	[6, 4, 2]
+	>>> m.prefixSums(6)
+	[6, 10, 12]
+	>>> m2 = RankMask(0b11, copies=2)
+	>>> len(m2)
+	4
+	>>> m2.bordas(6)
+	[6, 6, 5, 5]
+	"""
+
+	def __new__(cls, bits:int, copies:int=1):
+		mask = int.__new__(cls, bits)
+		mask.copies = copies
+		return mask
+
+	def __repr__(self):
+		return "RankMask({}{})".format(bin(self), "" if self.copies==1 else ", copies="+str(self.copies))
+
+	def __len__(self):
+		return bin(self).count("1") * self.copies
+
+	def bordas(self, itemCount:int)->list:
+		"""
+		return the list of Borda scores of the items in this bundle, in decreasing order,
+		for an agent that ranks itemCount items.
+		"""
+		result = []
+		bits = int(self)
+		while bits:
+			lowest = bits & -bits
+			result += [itemCount + 1 - lowest.bit_length()] * self.copies
+			bits ^= lowest
+		return result
+
+	def prefixSums(self, itemCount:int)->list:
+		"""
+		return the prefix sums of self.bordas(itemCount).
+		"""
+		return list(itertools.accumulate(self.bordas(itemCount)))
+
+
 if __name__ == "__main__":
 	import doctest
 	print(doctest.testmod())
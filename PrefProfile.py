@@ -1,6 +1,8 @@
 #!python3
 import numpy as  np
 from Pref import Pref
+from RankingProfile import RankingProfile
+from randomProfiles import isDiminishingDifferences
 
 class PrefProfile(object):
 	"""
@@ -11,6 +13,8 @@ class PrefProfile(object):
     Date:   2017-02
 	"""
 
+	__slots__ = ("agentsToPrefs", "prefs", "agents", "items", "itemCount", "agentCount", "_rankingProfile")
+
 	def __init__(self, mapAgentsToPrefs:dict):
 		"""
 		mapAgentsToPrefs: a dictionary that maps agents to Pref objects.
@@ -25,6 +29,7 @@ class PrefProfile(object):
 			raise ValueError("no items")
 		if self.agentCount<1:
 			raise ValueError("no agents")
+		self._rankingProfile = None
 
 	def __repr__(self):
 		return self.prefs.__repr__()
@@ -40,15 +45,65 @@ class PrefProfile(object):
 			for pref in self.prefs:
 				pref.removeItem(item)
 			self.itemCount -= 1
+			self._rankingProfile = None
 		else:
 			raise ValueError("item "+str(item)+" not found")
 
+	def rankingProfile(self)->RankingProfile:
+		"""
+		return an immutable RankingProfile with the current rankings of this profile.
+		It is created once and shared by all callers, until an item is removed from this profile.
+
+		>>> prefProfile = PrefProfile({"Alice":Pref([6,5,4,3,2,1]), "Bob":Pref([5,6,4,3,2,1])})
+		>>> prefProfile.rankingProfile() is prefProfile.rankingProfile()
+		True
+		"""
+		if self._rankingProfile is None:
+			self._rankingProfile = RankingProfile.fromPrefProfile(self)
+		return self._rankingProfile
+
+
+	def canonicalRankings(self)->tuple:
+		"""
+		return the rankings of the agents (in the order of self.agents), after relabeling the items 0,1,2,...
+		in the order of the first agent's ranking. So the first ranking is always (0,1,...,itemCount-1),
+		and two profiles that differ only by the names of the items have the same canonical rankings.
+
+		>>> PrefProfile({"A":Pref([6,5,4]), "B":Pref([4,6,5])}).canonicalRankings()
+		((0, 1, 2), (2, 0, 1))
+		>>> PrefProfile({"A":Pref(["y","x","z"]), "B":Pref(["z","y","x"])}).canonicalRankings()
+		((0, 1, 2), (2, 0, 1))
+		"""
+		labels = {item: label for (label, item) in enumerate(self.agentsToPrefs[self.agents[0]].ordinal)}
+		return tuple(
+			tuple(labels[item] for item in self.agentsToPrefs[agent].ordinal)
+			for agent in self.agents)
+
+
+	def identicalAgentGroups(self)->list:
+		"""
+		return a list of groups (lists) of agents that have identical rankings, in the order of self.agents.
+		Agents whose ranking is unique form a group of size 1.
+
+		>>> PrefProfile({"A":Pref([6,5,4]), "B":Pref([4,6,5]), "C":Pref([6,5,4])}).identicalAgentGroups()
+		[['A', 'C'], ['B']]
+		"""
+		groups = {}
+		for agent in self.agents:
+			groups.setdefault(tuple(self.agentsToPrefs[agent].ordinal), []).append(agent)
+		return list(groups.values())
+
 
 	def countDiminishingDifferences(self):
 		"""
 		count the number of preferences in this profile that have the DD property
+
+		>>> prefProfile = PrefProfile({"A":Pref(cardinal={1: 6.2, 2: 1.3, 3: 3.4}), "B":Pref(cardinal={1: 6.2, 2: 0.3, 3: 3.4})})
+		>>> prefProfile.countDiminishingDifferences()
+		1
 		"""
-		return sum(map(Pref.isDiminishingDifferences, self.prefs))
+		values = np.array([[pref.cardinal[item] for item in self.items] for pref in self.prefs])
+		return int(np.count_nonzero(isDiminishingDifferences(values)))
 
 	def bestItems(self)->set:
 		"""
@@ -65,29 +120,54 @@ class PrefProfile(object):
 
 
 	@staticmethod
-	def randomCardinal(agents:list, items:list, lowMarketValue:float, highMarketValue:float, maxNoiseSize:float):
+	def fromArrays(agents:list, items:list, values:np.ndarray=None, order:np.ndarray=None):
+		"""
+		Create a preference-profile from arrays of shape (agentCount, itemCount), e.g. a single profile of a batch created by randomProfiles.
+
+		values: values[a,i] is the value of item i to agent a. If it is given, it will also determine the rankings.
+		order:  order[a,r] is the item ranked by agent a at place r. Will be used only if values is not given.
+
+		>>> PrefProfile.fromArrays(["A","B"], ["x","y","z"], values=np.array([[3., 1., 2.], [1., 2., 3.]]))
+		[cardinal=x:3.0 z:2.0 y:1.0 ordinal=x>z>y, cardinal=z:3.0 y:2.0 x:1.0 ordinal=z>y>x]
+		>>> PrefProfile.fromArrays(["A","B"], ["x","y","z"], order=np.array([[0, 2, 1], [2, 1, 0]]))
+		[ ordinal=x>z>y,  ordinal=z>y>x]
+		"""
+		if values is not None:
+			return PrefProfile({
+				agent: Pref(cardinal=dict(zip(items, agentValues)))
+				for (agent, agentValues) in zip(agents, values.tolist())})
+		return PrefProfile({
+			agent: Pref(ordinal=[items[item] for item in agentOrder])
+			for (agent, agentOrder) in zip(agents, order.tolist())})
+
+	@staticmethod
+	def randomCardinal(agents:list, items:list, lowMarketValue:float, highMarketValue:float, maxNoiseSize:float, rng:np.random.Generator=None):
 		"""
 		Create a random preference-profile with cardinal utilities.
 		Randomization is uniform.
+		rng: the random generator to use. If None, the global np.random state is used.
 		"""
+		rng = np.random if rng is None else rng
 		marketValues = {
-			item: np.random.uniform(lowMarketValue,highMarketValue)
+			item: rng.uniform(lowMarketValue,highMarketValue)
 			for item in items
 			}
-		return PrefProfile({agent:Pref.randomCardinal(marketValues, maxNoiseSize) for agent in agents})
+		return PrefProfile({agent:Pref.randomCardinal(marketValues, maxNoiseSize, rng) for agent in agents})
 
 
 	@staticmethod
-	def randomCardinalGaussian(agents:list, items:list, lowMarketValue:float, highMarketValue:float, stddev:float):
+	def randomCardinalGaussian(agents:list, items:list, lowMarketValue:float, highMarketValue:float, stddev:float, rng:np.random.Generator=None):
 		"""
 		Create a random preference-profile with cardinal utilities.
 		Randomization is Gaussian.
+		rng: the random generator to use. If None, the global np.random state is used.
 		"""
+		rng = np.random if rng is None else rng
 		marketValues = {
-			item: np.random.uniform(lowMarketValue,highMarketValue)
+			item: rng.uniform(lowMarketValue,highMarketValue)
 			for item in items
 			}
-		return PrefProfile({agent:Pref.randomCardinalGaussian(marketValues, stddev) for agent in agents})
+		return PrefProfile({agent:Pref.randomCardinalGaussian(marketValues, stddev, rng) for agent in agents})
 
 
 if __name__ == "__main__":
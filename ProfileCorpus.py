@@ -0,0 +1,169 @@
+#!python3
+
+import json
+import os
+import numpy as np
+from PrefProfile import PrefProfile
+
+
+class ProfileCorpus(object):
+	"""
+	A large batch of preference profiles stored on disk, in a directory with the files:
+	* order.npy     - an integer array of shape (count, agentCount, itemCount) with the agents' rankings (see randomProfiles);
+	* values.npy    - an optional float array of the same shape with the agents' values;
+	* metadata.json - the agent and item names, and any other information (e.g. how the profiles were generated).
+
+	The arrays are plain .npy files opened as read-only memory maps, so opening a corpus is immediate,
+	nothing is unpickled, and only the profiles that are actually used are read from the disk.
+
+	>>> import tempfile
+	>>> directory = tempfile.mkdtemp()
+	>>> values = np.array([[[3., 1., 2.], [1., 2., 3.]], [[1., 2., 3.], [3., 2., 1.]]])
+	>>> corpus = ProfileCorpus.save(directory, values=values, agents=["A","B"], items=["x","y","z"], noise=0.5)
+	>>> len(corpus)
+	2
+	>>> corpus[1]
+	[cardinal=z:3.0 y:2.0 x:1.0 ordinal=z>y>x, cardinal=x:3.0 y:2.0 z:1.0 ordinal=x>y>z]
+	>>> corpus.metadata["noise"]
+	0.5
+	>>> type(ProfileCorpus(directory).order)
+	<class 'numpy.memmap'>
+	"""
+
+	__slots__ = ("directory", "metadata", "order", "values")
+
+	def __init__(self, directory:str):
+		"""
+		Open an existing corpus. The arrays are memory-mapped, not loaded.
+		"""
+		self.directory = directory
+		with open(os.path.join(directory, "metadata.json")) as file:
+			self.metadata = json.load(file)
+		self.order = np.load(os.path.join(directory, "order.npy"), mmap_mode="r", allow_pickle=False)
+		valuesFile = os.path.join(directory, "values.npy")
+		self.values = np.load(valuesFile, mmap_mode="r", allow_pickle=False) if os.path.exists(valuesFile) else None
+
+	def __repr__(self):
+		return "ProfileCorpus({}: {} profiles, {} agents, {} items)".format(
+			self.directory, len(self), len(self.agents), len(self.items))
+
+	def __len__(self):
+		return len(self.order)
+
+	@property
+	def agents(self)->list:
+		return self.metadata["agents"]
+
+	@property
+	def items(self)->list:
+		return self.metadata["items"]
+
+	def __getitem__(self, index:int)->PrefProfile:
+		"""
+		return the profile with the given index, as a PrefProfile.
+		"""
+		return PrefProfile.fromArrays(self.agents, self.items,
+			values=None if self.values is None else np.asarray(self.values[index]),
+			order=np.asarray(self.order[index]))
+
+	def __iter__(self):
+		for index in range(len(self)):
+			yield self[index]
+
+	def arrays(self, start:int=0, stop:int=None) -> (np.ndarray, np.ndarray):
+		"""
+		return (values, order) for the profiles in the range [start,stop), as (memory-mapped) arrays;
+		values is None if the corpus has no values.
+		"""
+		return (None if self.values is None else self.values[start:stop], self.order[start:stop])
+
+	@staticmethod
+	def save(directory:str, order:np.ndarray=None, values:np.ndarray=None, agents:list=None, items:list=None, **metadata)->"ProfileCorpus":
+		"""
+		Write a batch of profiles (e.g. from a sampler in randomProfiles) to a new corpus in the given directory, and open it.
+
+		order:  the rankings; if not given, they are computed from the values.
+		values: the values; may be None for an ordinal corpus.
+		agents, items: the names of the agents and items; default: 0,1,2,...
+		metadata: any additional JSON-serializable information to store with the corpus.
+		"""
+		if order is None:
+			order = np.argsort(-values, axis=-1, kind="stable")
+		corpus = ProfileCorpus.create(directory, order.shape[0], order.shape[1], order.shape[2],
+			hasValues = values is not None, agents=agents, items=items, **metadata)
+		corpus.order[:] = order
+		if values is not None:
+			corpus.values[:] = values
+		return corpus.flush()
+
+	@staticmethod
+	def generate(directory:str, sampler, count:int, agentCount:int, itemCount:int,
+				lowMarketValue:float, highMarketValue:float, noise:float, rng:np.random.Generator=None,
+				chunkSize:int=100000, **metadata)->"ProfileCorpus":
+		"""
+		Generate 'count' random profiles with the given sampler from randomProfiles (see simulations.avergeOverRandomProfiles),
+		and write them to a new corpus in the given directory, chunk by chunk, so the whole batch is never held in memory.
+
+		>>> import tempfile, randomProfiles
+		>>> corpus = ProfileCorpus.generate(tempfile.mkdtemp(), randomProfiles.mallowsBatch, 5, 2, 4, 1, 2, 0.5, rng=np.random.default_rng(1), chunkSize=2)
+		>>> len(corpus), corpus.agents, corpus.items
+		(5, [0, 1], [0, 1, 2, 3])
+		>>> corpus.metadata["sampler"], corpus.values is None
+		('mallowsBatch', True)
+		>>> len(ProfileCorpus.generate(tempfile.mkdtemp(), randomProfiles.randomCardinalBatch, 0, 2, 4, 1, 2, 0.5))
+		0
+		"""
+		# The first chunk (possibly empty) is sampled before the corpus is created, to know whether the sampler returns values:
+		(values, order) = sampler(min(chunkSize, count), agentCount, itemCount, lowMarketValue, highMarketValue, noise, rng=rng)
+		corpus = ProfileCorpus.create(directory, count, agentCount, itemCount, hasValues = values is not None,
+			sampler=getattr(sampler, "__name__", repr(sampler)),
+			lowMarketValue=lowMarketValue, highMarketValue=highMarketValue, noise=noise, **metadata)
+		for start in range(0, count, chunkSize):
+			size = min(chunkSize, count - start)
+			if start > 0:
+				(values, order) = sampler(size, agentCount, itemCount, lowMarketValue, highMarketValue, noise, rng=rng)
+			corpus.order[start:start+size] = order
+			if values is not None:
+				corpus.values[start:start+size] = values
+		return corpus.flush()
+
+	@staticmethod
+	def create(directory:str, count:int, agentCount:int, itemCount:int, hasValues:bool=True,
+				agents:list=None, items:list=None, **metadata)->"ProfileCorpus":
+		"""
+		Create a new corpus with writable, zero-filled arrays of the given sizes, to be filled by the caller.
+		Call flush() when done.
+		"""
+		os.makedirs(directory, exist_ok=True)
+		metadata["agents"] = list(range(agentCount)) if agents is None else list(agents)
+		metadata["items"]  = list(range(itemCount))  if items  is None else list(items)
+		with open(os.path.join(directory, "metadata.json"), "w") as file:
+			json.dump(metadata, file, indent=1)
+		shape = (count, agentCount, itemCount)
+		orderType = np.int16 if itemCount <= np.iinfo(np.int16).max else np.int32
+		np.lib.format.open_memmap(os.path.join(directory, "order.npy"), mode="w+", dtype=orderType, shape=shape).flush()
+		if hasValues:
+			np.lib.format.open_memmap(os.path.join(directory, "values.npy"), mode="w+", dtype=np.float64, shape=shape).flush()
+		else:
+			valuesFile = os.path.join(directory, "values.npy")
+			if os.path.exists(valuesFile):
+				os.remove(valuesFile)
+		corpus = ProfileCorpus(directory)
+		corpus.order = np.load(os.path.join(directory, "order.npy"), mmap_mode="r+")
+		if hasValues:
+			corpus.values = np.load(os.path.join(directory, "values.npy"), mmap_mode="r+")
+		return corpus
+
+	def flush(self)->"ProfileCorpus":
+		"""
+		Write all changes to the disk, and re-open the corpus as read-only.
+		"""
+		for array in (self.order, self.values):
+			if isinstance(array, np.memmap):
+				array.flush()
+		return ProfileCorpus(self.directory)
+
+
+if __name__ == "__main__":
+	import doctest
+	print(doctest.testmod())
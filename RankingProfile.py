@@ -0,0 +1,160 @@
+#!python3
+
+class RankingProfile(object):
+	"""
+	An immutable, compact representation of the rankings in a PrefProfile.
+	Items are represented by dense ids 0,...,m-1 (their index in self.items),
+	and agents by their index in self.agents.
+	Since it is never modified, a single RankingProfile can be shared by any number of
+	RemainingItems views, so allocation algorithms never have to copy the preferences.
+
+	>>> from Pref import Pref
+	>>> from PrefProfile import PrefProfile
+	>>> profile = RankingProfile.fromPrefProfile(PrefProfile({"Alice":Pref(["c","b","a"]), "Bob":Pref(["b","a","c"])}))
+	>>> profile
+	Alice:c>b>a Bob:b>a>c
+	>>> profile.order
+	((2, 1, 0), (1, 0, 2))
+	>>> profile.rank
+	((2, 1, 0), (1, 0, 2))
+	>>> profile.order = None
+	Traceback (most recent call last):
+	...
+	AttributeError: RankingProfile is immutable
+	"""
+
+	__slots__ = ("agents", "items", "agentIds", "itemIds", "order", "rank")
+
+	def __init__(self, agents:list, items:list, order:list):
+		"""
+		agents: a list of agent names.
+		items:  a list of item names.
+		order:  for each agent (in the order of 'agents'), a list of all item ids from best to worst.
+		"""
+		itemCount = len(items)
+		rank = []
+		for agentOrder in order:
+			agentRank = [None]*itemCount
+			for (position, item) in enumerate(agentOrder):
+				agentRank[item] = position
+			rank.append(tuple(agentRank))
+		setAttribute = object.__setattr__
+		setAttribute(self, "agents", tuple(agents))
+		setAttribute(self, "items", tuple(items))
+		setAttribute(self, "agentIds", {agent: id for (id, agent) in enumerate(agents)})
+		setAttribute(self, "itemIds", {item: id for (id, item) in enumerate(items)})
+		setAttribute(self, "order", tuple(tuple(agentOrder) for agentOrder in order))
+		setAttribute(self, "rank", tuple(rank))
+
+	def __setattr__(self, name, value):
+		raise AttributeError("RankingProfile is immutable")
+
+	def __repr__(self):
+		return " ".join(
+			str(agent) + ":" + ">".join(str(self.items[item]) for item in agentOrder)
+			for (agent, agentOrder) in zip(self.agents, self.order))
+
+	@property
+	def agentCount(self)->int:
+		return len(self.agents)
+
+	@property
+	def itemCount(self)->int:
+		return len(self.items)
+
+	@staticmethod
+	def fromPrefProfile(prefProfile)->"RankingProfile":
+		"""
+		Create a RankingProfile with the current agents, items and rankings of the given PrefProfile.
+		"""
+		itemIds = {item: id for (id, item) in enumerate(prefProfile.items)}
+		order = [
+			[itemIds[item] for item in prefProfile.agentsToPrefs[agent].ordinal]
+			for agent in prefProfile.agents]
+		return RankingProfile(prefProfile.agents, prefProfile.items, order)
+
+	def remaining(self)->"RemainingItems":
+		"""
+		return a new view in which all items are still available.
+		"""
+		return RemainingItems(self)
+
+
+
+class RemainingItems(object):
+	"""
+	A view of the items of a RankingProfile that have not been removed yet.
+	Removing an item only sets its entry in a removed-mask; the shared rankings are never touched.
+	Each agent has a cursor into its ranking, which only moves forward past removed items,
+	so bestItem and removeItem take amortized O(1) time, and a whole picking sequence takes O(n*m) time.
+	Items and agents are referred to by their names, like in PrefProfile.
+
+	>>> from Pref import Pref
+	>>> from PrefProfile import PrefProfile
+	>>> profile = RankingProfile.fromPrefProfile(PrefProfile({"Alice":Pref([6,5,4,3,2,1]), "Bob":Pref([5,6,4,3,2,1])}))
+	>>> remaining = profile.remaining()
+	>>> remaining.bestItem("Alice")
+	6
+	>>> remaining.removeItem(6)
+	>>> remaining.bestItem("Alice"), remaining.bestItem("Bob")
+	(5, 5)
+	>>> remaining.items
+	[1, 2, 3, 4, 5]
+	>>> remaining.itemCount
+	5
+	>>> remaining.removeItem(6)
+	Traceback (most recent call last):
+	...
+	ValueError: item 6 not found
+	>>> profile.remaining().itemCount
+	6
+	>>> remaining.removeItem(4)
+	>>> remaining.removeItem(5)
+	>>> remaining.bestItem("Alice"), remaining.bestItem("Bob")
+	(3, 3)
+	"""
+
+	__slots__ = ("profile", "removed", "itemCount", "cursors")
+
+	def __init__(self, profile:RankingProfile):
+		self.profile = profile
+		self.removed = bytearray(profile.itemCount)
+		self.itemCount = profile.itemCount
+		self.cursors = [0]*profile.agentCount
+
+	@property
+	def items(self)->list:
+		"""
+		return the names of the remaining items, in the order of the profile's items.
+		"""
+		return [item for (item, removed) in zip(self.profile.items, self.removed) if not removed]
+
+	def bestItem(self, agent):
+		"""
+		return the name of the best remaining item of the given agent.
+		"""
+		agentId = self.profile.agentIds[agent]
+		order = self.profile.order[agentId]
+		removed = self.removed
+		cursor = self.cursors[agentId]
+		while cursor < len(order) and removed[order[cursor]]:
+			cursor += 1
+		self.cursors[agentId] = cursor
+		if cursor == len(order):
+			raise ValueError("no items left")
+		return self.profile.items[order[cursor]]
+
+	def removeItem(self, item):
+		"""
+		Remove the given item (given by name) from all preferences in this view.
+		"""
+		id = self.profile.itemIds.get(item)
+		if id is None or self.removed[id]:
+			raise ValueError("item "+str(item)+" not found")
+		self.removed[id] = 1
+		self.itemCount -= 1
+
+
+if __name__ == "__main__":
+	import doctest
+	print(doctest.testmod())
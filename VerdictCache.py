@@ -0,0 +1,139 @@
+#!python3
+
+import shelve
+from collections import OrderedDict
+
+
+class VerdictCache(object):
+	"""
+	A cache of ordinal verdicts, i.e., results of a function that depends only on the agents' rankings,
+	such as the existence of NecPR/NDDPR/PDDPR/PosPR allocations.
+	The profiles are keyed by their canonical rankings (see PrefProfile.canonicalRankings),
+	so profiles that differ only by the names of their items share a single entry.
+	The keys also contain a namespace that identifies the verdict function,
+	so several functions can share a cache (and an on-disk database) without getting each other's verdicts.
+
+	The most recently used verdicts are kept in memory, up to maxSize entries.
+	If a filename is given, all verdicts are also kept in a 'shelve' database with that name,
+	so that they are shared between runs.
+
+	>>> from Pref import Pref
+	>>> from PrefProfile import PrefProfile
+	>>> cache = VerdictCache(maxSize=2)
+	>>> countBest = lambda profile: (len(profile.bestItems()),)
+	>>> cache.verdicts(PrefProfile({"A":Pref([1,2,3]), "B":Pref([2,1,3])}), countBest)
+	(2,)
+	>>> cache.verdicts(PrefProfile({"A":Pref([3,2,1]), "B":Pref([2,3,1])}), countBest)
+	(2,)
+	>>> cache.hits, cache.misses
+	(1, 1)
+	"""
+
+	__slots__ = ("maxSize", "memory", "store", "namespace", "hits", "misses")
+
+	def __init__(self, maxSize:int=100000, filename:str=None, namespace:str=None):
+		"""
+		maxSize:  maximum number of verdicts to keep in memory.
+		filename: name of an optional on-disk database for keeping the verdicts between runs.
+		namespace: a tag that identifies the verdict function in all keys.
+		   If None, the module and qualified name of each function passed to verdicts() are used;
+		   a namespace should be given if the function is a lambda, or if its name may change between runs.
+		"""
+		self.maxSize = maxSize
+		self.namespace = namespace
+		self.memory = OrderedDict()
+		self.store = None if filename is None else shelve.open(filename)
+		self.hits = self.misses = 0
+
+	def __len__(self):
+		return len(self.memory)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def close(self):
+		"""
+		Close the on-disk database, if any.
+		"""
+		if self.store is not None:
+			self.store.close()
+			self.store = None
+
+	def namespaceOf(self, computeVerdicts)->str:
+		"""
+		return the namespace of the keys of the given verdict function.
+
+		>>> from PrefProfile import PrefProfile
+		>>> VerdictCache().namespaceOf(PrefProfile.bestItems)
+		'PrefProfile.PrefProfile.bestItems'
+		>>> VerdictCache(namespace="existence").namespaceOf(PrefProfile.bestItems)
+		'existence'
+		"""
+		if self.namespace is not None:
+			return self.namespace
+		return "{}.{}".format(getattr(computeVerdicts, "__module__", None), getattr(computeVerdicts, "__qualname__", repr(computeVerdicts)))
+
+	def get(self, key:tuple):
+		"""
+		return the verdicts for the given key (a namespace and canonical rankings), or None if they are not cached.
+		"""
+		if key in self.memory:
+			self.memory.move_to_end(key)
+			return self.memory[key]
+		if self.store is not None:
+			verdicts = self.store.get(repr(key))
+			if verdicts is not None:
+				self.remember(key, verdicts)
+			return verdicts
+		return None
+
+	def put(self, key:tuple, verdicts:tuple):
+		"""
+		cache the verdicts for the given key (a namespace and canonical rankings).
+		"""
+		self.remember(key, verdicts)
+		if self.store is not None:
+			self.store[repr(key)] = verdicts
+
+	def remember(self, key:tuple, verdicts:tuple):
+		self.memory[key] = verdicts
+		self.memory.move_to_end(key)
+		if len(self.memory) > self.maxSize:
+			self.memory.popitem(last=False)
+
+	def verdicts(self, prefProfile, computeVerdicts)->tuple:
+		"""
+		return computeVerdicts(prefProfile), calling it only if the verdicts of an equivalent profile are not cached.
+
+		>>> import tempfile, os
+		>>> from Pref import Pref
+		>>> from PrefProfile import PrefProfile
+		>>> filename = os.path.join(tempfile.mkdtemp(), "verdicts")
+		>>> profile = PrefProfile({"A":Pref([1,2]), "B":Pref([2,1])})
+		>>> with VerdictCache(filename=filename, namespace="existence") as cache: cache.verdicts(profile, lambda profile: (True,False))
+		(True, False)
+		>>> with VerdictCache(filename=filename, namespace="existence") as cache: cache.verdicts(profile, None)
+		(True, False)
+
+		Verdicts of another function, in the same database, are kept separately:
+
+		>>> with VerdictCache(filename=filename, namespace="fairness") as cache: cache.verdicts(profile, lambda profile: (False,))
+		(False,)
+		"""
+		key = (self.namespaceOf(computeVerdicts), prefProfile.canonicalRankings())
+		verdicts = self.get(key)
+		if verdicts is None:
+			self.misses += 1
+			verdicts = tuple(computeVerdicts(prefProfile))
+			self.put(key, verdicts)
+		else:
+			self.hits += 1
+		return verdicts
+
+
+if __name__ == "__main__":
+	import doctest
+	print(doctest.testmod())
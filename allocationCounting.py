@@ -0,0 +1,158 @@
+#!python3
+
+"""
+Counting proportional allocations without enumerating the partitions.
+
+For proportionality, the verdict of each agent depends only on its own bundle,
+so an allocation satisfies a criterion iff every agent accepts its bundle (see bundleVerdicts.ProportionalityTables).
+Hence, the number of such allocations is the number of ordered partitions of the items into bundles,
+one acceptable bundle per agent:
+
+* For 2 agents, it is a single pass over the bundles of the first agent, checking the complement for the second agent.
+* For 3 or more agents, the partial covers of the first agents are combined with the bundles of the next agent by
+  ranked subset convolution (zeta transform, pointwise product, Moebius transform) over all 2^m subsets of the items;
+  the last agent is again matched by the complement.
+  This takes time and memory proportional to m * 2^m, so it is used only up to maxItems items;
+  above that, the partitions are enumerated in revolving-door order, updating the verdicts incrementally.
+
+Date:   2026-10
+"""
+
+import numpy as np
+from partitions import equalPartitions, revolvingDoorPartitions
+from bundleVerdicts import ProportionalityTables, IncrementalProportionality, NEC, NDD, PDD, POS, CARD
+
+MAX_CONVOLUTION_ITEMS = 24
+
+
+def countProportionalAllocations(tables:ProportionalityTables, flags:int, maxItems:int=MAX_CONVOLUTION_ITEMS)->int:
+    """
+    return the number of equal partitions in which every agent's bundle has all the given flags,
+    i.e., the number of allocations for which tables.allocationFlags(allocation) contains flags.
+
+    >>> from Pref import Pref
+    >>> from PrefProfile import PrefProfile
+    >>> prefProfile = PrefProfile({"Alice":Pref(cardinal={6:6,5:5,4:4,3:3,2:2,1:1}), "Bob":Pref(cardinal={5:6,6:5,3:4,4:3,1:2,2:1})})
+    >>> tables = ProportionalityTables(prefProfile)
+    >>> [countProportionalAllocations(tables, flags) for flags in (NEC, NDD, PDD, POS, CARD, NEC|CARD)]
+    [1, 3, 7, 11, 4, 1]
+    >>> [sum(tables.allocationFlags(allocation) & flags == flags for allocation in equalPartitions(prefProfile.agents, prefProfile.items)) for flags in (NEC, NDD, PDD, POS, CARD, NEC|CARD)]
+    [1, 3, 7, 11, 4, 1]
+
+    >>> prefProfile = PrefProfile({"A":Pref([1,2,3,4,5,6]), "B":Pref([2,1,4,3,6,5]), "C":Pref([3,4,5,6,1,2])})
+    >>> tables = ProportionalityTables(prefProfile)
+    >>> [countProportionalAllocations(tables, flags) for flags in (NEC, NDD, PDD, POS)]
+    [0, 6, 10, 46]
+    >>> [countProportionalAllocations(tables, flags, maxItems=0) for flags in (NEC, NDD, PDD, POS)]
+    [0, 6, 10, 46]
+    """
+    agentCount = len(tables.agents)
+    itemCount = tables.bundleSize * agentCount
+    acceptances = [(np.array(tables.tables[agent]) & flags) == flags for agent in tables.agents]
+    if not all(acceptance.any() for acceptance in acceptances):
+        return 0
+    if agentCount == 1:
+        return int(acceptances[0][0])
+    if agentCount > 2 and itemCount > maxItems:
+        return _countByEnumeration(tables, flags)
+
+    masks = np.left_shift(np.int64(1), tables.bundles).sum(axis=1)
+    allItems = (1 << itemCount) - 1
+    if agentCount == 2:
+        covers = acceptances[0].astype(np.int64)
+        coverMasks = masks
+    else:
+        sizes = _popcounts(itemCount)
+        covers = np.zeros(1 << itemCount, dtype=np.int64)
+        covers[masks] = acceptances[0]
+        for agent in range(1, agentCount - 1):
+            bundles = np.zeros(1 << itemCount, dtype=np.int64)
+            bundles[masks] = acceptances[agent]
+            _zetaTransform(covers, itemCount)
+            _zetaTransform(bundles, itemCount)
+            covers *= bundles    # may overflow, but the transforms are linear, so the final counts are still exact
+            _moebiusTransform(covers, itemCount)
+            covers[sizes != (agent + 1) * tables.bundleSize] = 0
+        coverMasks = np.flatnonzero(covers)
+        covers = covers[coverMasks]
+
+    # The last agent gets the complement of the cover of the other agents:
+    order = np.argsort(masks)
+    complements = allItems ^ coverMasks
+    positions = order[np.searchsorted(masks, complements, sorter=order)]
+    return int(np.dot(covers, acceptances[-1][positions]))
+
+
+def countProportionalityCriteria(prefProfile, maxItems:int=MAX_CONVOLUTION_ITEMS)->dict:
+    """
+    return a dict that maps each combination of flags used by the simulations
+    (NEC, NDD, PDD, POS, each alone and together with CARD, and CARD alone)
+    to the number of equal partitions that satisfy it.
+
+    >>> from Pref import Pref
+    >>> from PrefProfile import PrefProfile
+    >>> prefProfile = PrefProfile({"Alice":Pref(cardinal={6:6,5:5,4:4,3:3,2:2,1:1}), "Bob":Pref(cardinal={5:6,6:5,3:4,4:3,1:2,2:1})})
+    >>> counts = countProportionalityCriteria(prefProfile)
+    >>> counts[CARD], counts[NDD], counts[NDD | CARD]
+    (4, 3, 3)
+    """
+    tables = ProportionalityTables(prefProfile)
+    counts = {CARD: countProportionalAllocations(tables, CARD, maxItems)}
+    for flag in (NEC, NDD, PDD, POS):
+        counts[flag] = countProportionalAllocations(tables, flag, maxItems)
+        counts[flag | CARD] = countProportionalAllocations(tables, flag | CARD, maxItems)
+    return counts
+
+
+def _countByEnumeration(tables:ProportionalityTables, flags:int)->int:
+    # Consecutive partitions differ by a swap of two items, so only the two affected agents are looked up again:
+    partitions = revolvingDoorPartitions(tables.agents, list(tables.bits))
+    (allocation, swap) = next(partitions)
+    tracker = IncrementalProportionality(tables, allocation)
+    count = tracker.flags() & flags == flags
+    for (allocation, swap) in partitions:
+        tracker.update(swap)
+        count += tracker.flags() & flags == flags
+    return int(count)
+
+
+def _popcounts(itemCount:int)->np.ndarray:
+    """
+    return an array with the number of set bits in each integer 0,...,2^itemCount-1.
+
+    >>> _popcounts(3)
+    array([0, 1, 1, 2, 1, 2, 2, 3], dtype=uint8)
+    """
+    sizes = np.zeros(1, dtype=np.uint8)
+    for _ in range(itemCount):
+        sizes = np.concatenate((sizes, sizes + 1))
+    return sizes
+
+
+def _zetaTransform(values:np.ndarray, itemCount:int):
+    """
+    in place: values[S] becomes the sum of values[T] over all subsets T of S.
+
+    >>> values = np.array([1, 2, 3, 4])
+    >>> _zetaTransform(values, 2); values
+    array([ 1,  3,  4, 10])
+    >>> _moebiusTransform(values, 2); values
+    array([1, 2, 3, 4])
+    """
+    for item in range(itemCount):
+        pairs = values.reshape(-1, 2, 1 << item)
+        pairs[:, 1, :] += pairs[:, 0, :]
+
+
+def _moebiusTransform(values:np.ndarray, itemCount:int):
+    """
+    in place: the inverse of _zetaTransform.
+    """
+    for item in range(itemCount):
+        pairs = values.reshape(-1, 2, 1 << item)
+        pairs[:, 1, :] -= pairs[:, 0, :]
+
+
+if __name__ == "__main__":
+    import doctest
+    print(doctest.testmod())
@@ -0,0 +1,460 @@
+#!python3
+
+"""
+Per-agent verdict tables for proportionality and envy-freeness.
+
+For proportionality, the verdict of each agent depends only on its own bundle.
+So instead of checking every agent in every allocation, we compute, once per profile,
+the verdicts of each agent for all bundles of itemsPerAgent items, in one vectorized pass;
+the verdicts of an allocation are then a few table lookups.
+
+For envy-freeness, the verdict of each agent depends on a pair of bundles, so a full table is too large.
+Instead, we compute once per profile the signature of each bundle for each agent
+(its sorted Borda scores, their prefix sums and its value), and compare signatures on demand.
+
+When the allocations are generated by partitions.revolvingDoorPartitions, each allocation differs from the previous one
+by a swap of two items, so IncrementalProportionality and IncrementalEnvyFreeness update only the verdicts of the two affected agents.
+
+The verdicts are kept as bit flags: NEC, NDD, PDD, POS (the ordinal criteria of itemAssignment.isProportional / isEnvyFree)
+and CARD (isCardinallyProportional / isCardinallyEnvyFree).
+
+Date:   2026-10
+"""
+
+from itertools import combinations
+from operator import ge, gt, eq
+import numpy as np
+from ArrayPref import sortedBordas, necessarilyWeaklyBetter, nddWeaklyBetter, pddWeaklyBetter, possiblyWeaklyBetter
+
+NEC  = 1
+NDD  = 2
+PDD  = 4
+POS  = 8
+CARD = 16
+ORDINAL = NEC | NDD | PDD | POS
+
+
+def impliedFlags(flags:int)->int:
+    """
+    return the given flags, together with the ordinal flags implied by them along the chain NEC => NDD => PDD => POS
+    (for envy-freeness, PDD and POS are the weak variants, for which the chain holds too).
+
+    >>> impliedFlags(NDD) == NDD | PDD | POS
+    True
+    >>> impliedFlags(NEC | CARD) == ORDINAL | CARD
+    True
+    """
+    if flags & NEC: flags |= NDD
+    if flags & NDD: flags |= PDD
+    if flags & PDD: flags |= POS
+    return flags
+
+
+class ImplicationCounters(object):
+    """
+    Statistics of the shortcuts taken along the implication chain NEC => NDD => PDD => POS.
+    The verdicts along the chain are monotone, so weakRelationFlags checks the weakest criterion (POS) first,
+    and then does a binary search from the middle (NDD) outwards:
+
+    * posFailures:  POS failed, so NEC, NDD and PDD failed too, without being checked.
+    * nddHolds:     NDD held (in a middle evaluation), so PDD held too, without being checked; then NEC is checked.
+    * nddFailures:  NDD failed (in a middle evaluation), so NEC failed too, without being checked; then PDD is checked, if needed.
+    * pddSkipped:   NDD failed, and PDD was not needed by the caller.
+    * impliedWitnesses: itemAssignment.existenceFlags witnessed a criterion only through a stronger one
+      that implies it (e.g. an allocation with NEC witnesses NDD, PDD and POS too).
+
+    Only the counts that cannot be derived from the others are kept, to keep weakRelationFlags fast.
+    """
+
+    __slots__ = ("calls", "posFailures", "nddHolds", "pddSkipped", "impliedWitnesses")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = self.posFailures = self.nddHolds = self.pddSkipped = self.impliedWitnesses = 0
+
+    @property
+    def nddFailures(self)->int:
+        return self.calls - self.posFailures - self.nddHolds
+
+    @property
+    def evaluations(self)->dict:
+        """
+        return a dict that maps each criterion flag to the number of times it was actually checked.
+        """
+        return {NEC: self.nddHolds, NDD: self.calls - self.posFailures,
+                PDD: self.nddFailures - self.pddSkipped, POS: self.calls}
+
+    def report(self)->str:
+        """
+        >>> counters = ImplicationCounters()
+        >>> counters.calls += 2; counters.posFailures += 1
+        >>> print(counters.report())
+        evaluations: NEC 0, NDD 1, PDD 1, POS 2
+        POS failed (NEC, NDD, PDD implied false): 1
+        NDD held (PDD implied true): 0
+        NDD failed (NEC implied false): 1
+        PDD not needed: 0
+        Witnesses implied by stronger criteria: 0
+        """
+        evaluations = self.evaluations
+        return "\n".join([
+            "evaluations: NEC {}, NDD {}, PDD {}, POS {}".format(evaluations[NEC], evaluations[NDD], evaluations[PDD], evaluations[POS]),
+            "POS failed (NEC, NDD, PDD implied false): {}".format(self.posFailures),
+            "NDD held (PDD implied true): {}".format(self.nddHolds),
+            "NDD failed (NEC implied false): {}".format(self.nddFailures),
+            "PDD not needed: {}".format(self.pddSkipped),
+            "Witnesses implied by stronger criteria: {}".format(self.impliedWitnesses)])
+
+
+implicationCounters = ImplicationCounters()   # updated by all calls to weakRelationFlags
+
+
+def weakRelationFlags(bordas1:list, sums1:list, bordas2:list, sums2:list, flags:int=ORDINAL)->int:
+    """
+    bordas1, bordas2: the Borda scores of two bundles, in decreasing order.
+    sums1, sums2:     their prefix sums.
+    flags:            the criteria that are needed; PDD is not checked if it is not needed.
+
+    return the flags of the ordinal criteria by which bundle1 >= bundle2,
+    with the same semantics as Pref.isNecessarilyWeaklyBetter, isNDDWeaklyBetter, isPDDWeaklyBetter and isPossiblyWeaklyBetter
+    (also when the bundles have different sizes).
+    The criteria are checked along their implication chain, and the shortcuts are counted in implicationCounters.
+
+    >>> implicationCounters.reset()
+    >>> weakRelationFlags([6,3,2], [6,9,11], [5,4,1], [5,9,10]) == NDD | PDD | POS
+    True
+    >>> weakRelationFlags([6,3], [6,9], [5,4,1], [5,9,10]) == PDD | POS
+    True
+    >>> weakRelationFlags([3,2,1], [3,5,6], [6,5,4], [6,11,15])
+    0
+    >>> implicationCounters.evaluations == {NEC: 1, NDD: 2, PDD: 1, POS: 3}
+    True
+    >>> implicationCounters.posFailures, implicationCounters.nddHolds, implicationCounters.nddFailures
+    (1, 1, 1)
+    """
+    counters = implicationCounters
+    counters.calls += 1
+    longer = len(bordas1) > len(bordas2)
+    # The weakest criterion first - if it fails, all stronger criteria fail:
+    if not (longer or any(map(gt, bordas1, bordas2)) or all(map(eq, bordas1, bordas2))):
+        counters.posFailures += 1
+        return 0
+    # Then the middle criterion:
+    if len(bordas1) >= len(bordas2) and all(map(ge, sums1, sums2)):
+        counters.nddHolds += 1
+        if all(map(ge, bordas1, bordas2)):
+            return ORDINAL
+        return NDD | PDD | POS
+    if not flags & PDD:
+        counters.pddSkipped += 1
+        return POS
+    # "possibly" means that some element is larger, or all elements are equal:
+    if longer or any(map(gt, sums1, sums2)) or all(map(eq, sums1, sums2)):
+        return PDD | POS
+    return POS
+
+
+class BundleTables(object):
+    """
+    The common part of ProportionalityTables and EnvyFreenessTables:
+    the bundles of itemsPerAgent items, in the order of itertools.combinations, and a map from each bundle to its index.
+    """
+
+    __slots__ = ("agents", "bits", "bundleSize", "bundles", "index")
+
+    def __init__(self, prefProfile):
+        agentCount = prefProfile.agentCount
+        itemCount = prefProfile.itemCount
+        if itemCount % agentCount != 0:
+            raise ValueError("{} requires equal bundles, but there are {} items and {} agents".format(type(self).__name__, itemCount, agentCount))
+        self.agents = prefProfile.agents
+        self.bundleSize = itemCount // agentCount
+        self.bits = {item: 1 << i for (i, item) in enumerate(prefProfile.items)}
+
+        # All bundles, as arrays of item indices, in the order of itertools.combinations:
+        self.bundles = np.array(list(combinations(range(itemCount), self.bundleSize)), dtype=np.intp).reshape(-1, self.bundleSize)
+        masks = np.left_shift(1, self.bundles).sum(axis=1).tolist() if itemCount < 63 else \
+            [sum(1 << int(i) for i in bundle) for bundle in self.bundles]
+        self.index = {mask: i for (i, mask) in enumerate(masks)}
+
+    @property
+    def bundleCount(self)->int:
+        return len(self.index)
+
+    def bundleIndex(self, bundle)->int:
+        """
+        return the index of the given bundle (a list of items) in the tables.
+        """
+        bits = self.bits
+        return self.index[sum(bits[item] for item in bundle)]
+
+
+class ProportionalityTables(BundleTables):
+    """
+    The proportionality verdicts of all agents in a profile, for all bundles of itemsPerAgent items.
+
+    >>> from Pref import Pref
+    >>> from PrefProfile import PrefProfile
+    >>> prefProfile = PrefProfile({"Alice":Pref(cardinal={6:6,5:5,4:4,3:3,2:2,1:1}), "Bob":Pref(cardinal={5:6,6:5,3:4,4:3,1:2,2:1})})
+    >>> tables = ProportionalityTables(prefProfile)
+    >>> tables.bundleCount
+    20
+    >>> flags = tables.flagsOf("Alice", [6,4,2])
+    >>> bool(flags & NEC), bool(flags & NDD), bool(flags & CARD)
+    (True, True, True)
+    >>> flags = tables.flagsOf("Alice", [6,3,2])
+    >>> bool(flags & NEC), bool(flags & NDD), bool(flags & CARD)
+    (False, True, True)
+    >>> flags = tables.allocationFlags({"Alice":[6,3,2], "Bob":[5,4,1]})
+    >>> bool(flags & NEC), bool(flags & NDD), bool(flags & POS)
+    (False, True, True)
+    """
+
+    __slots__ = ("tables",)
+
+    def __init__(self, prefProfile):
+        BundleTables.__init__(self, prefProfile)
+        agentCount = prefProfile.agentCount
+        itemCount = prefProfile.itemCount
+        items = prefProfile.items
+        bundles = self.bundles
+
+        allBordas = np.arange(itemCount, 0, -1)
+        self.tables = {}
+        for (agent, pref) in prefProfile.agentsToPrefs.items():
+            bordas = np.array([pref.borda[item] for item in items])
+            duplicateBordas = np.repeat(sortedBordas(bordas, bundles), agentCount, axis=-1)
+            table = np.zeros(len(bundles), dtype=np.uint8)
+            table |= NEC * necessarilyWeaklyBetter(duplicateBordas, allBordas).astype(np.uint8)
+            table |= NDD * nddWeaklyBetter(duplicateBordas, allBordas).astype(np.uint8)
+            table |= PDD * pddWeaklyBetter(duplicateBordas, allBordas).astype(np.uint8)
+            table |= POS * possiblyWeaklyBetter(duplicateBordas, allBordas).astype(np.uint8)
+            if pref.cardinal is not None:
+                values = np.array([pref.cardinal[item] for item in items])
+                table |= CARD * (values[bundles].sum(axis=1) * agentCount >= values.sum()).astype(np.uint8)
+            self.tables[agent] = table.tolist()
+
+    def flagsOf(self, agent, bundle)->int:
+        """
+        return the verdict flags of the given agent for the given bundle.
+        """
+        return self.tables[agent][self.bundleIndex(bundle)]
+
+    def allocationFlags(self, allocation:dict)->int:
+        """
+        return the verdict flags of the given allocation: a flag is set iff it is set for all agents.
+        """
+        flags = NEC | NDD | PDD | POS | CARD
+        for agent in self.agents:
+            flags &= self.flagsOf(agent, allocation[agent])
+            if not flags:
+                break
+        return flags
+
+
+class EnvyFreenessTables(BundleTables):
+    """
+    The envy-freeness verdicts of all agents in a profile, for pairs of bundles of itemsPerAgent items.
+
+    For each agent and bundle, the signature of the bundle (its sorted Borda scores, their prefix sums and its value)
+    is computed once, in one vectorized pass per agent.
+    The relation of an agent between two bundles is then computed from their signatures,
+    and kept in a cache of (agent, bundle1, bundle2) -> flags; the cache is cleared when it reaches cacheSize entries.
+
+    The flags are NEC, NDD (as in isNecessarilyEnvyFree, isNDDEnvyFree), PDD, POS (as in isWeakPDDEnvyFree, isWeakPossiblyEnvyFree)
+    and CARD (as in isCardinallyEnvyFree).
+
+    >>> from Pref import Pref
+    >>> from PrefProfile import PrefProfile
+    >>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[6,5,4,3,2,1]), "Bob":Pref(ordinal=[5,6,3,4,1,2])})
+    >>> tables = EnvyFreenessTables(prefProfile)
+    >>> flags = tables.allocationFlags({"Alice":[6,4,2], "Bob":[5,3,1]})
+    >>> bool(flags & NEC), bool(flags & NDD), bool(flags & POS)
+    (True, True, True)
+    >>> flags = tables.allocationFlags({"Alice":[6,3,1], "Bob":[5,4,2]})
+    >>> bool(flags & NEC), bool(flags & NDD), bool(flags & PDD), bool(flags & POS)
+    (False, False, True, True)
+    >>> flags = tables.flagsOf("Alice", [6,3,1], [5,4,2])
+    >>> bool(flags & NDD), bool(flags & PDD)
+    (False, True)
+    """
+
+    __slots__ = ("signatures", "prefixSums", "values", "cache", "cacheSize")
+
+    def __init__(self, prefProfile, cacheSize:int=1000000):
+        BundleTables.__init__(self, prefProfile)
+        items = prefProfile.items
+        bundles = self.bundles
+        self.signatures = {}
+        self.prefixSums = {}
+        self.values = {}
+        for (agent, pref) in prefProfile.agentsToPrefs.items():
+            bordas = sortedBordas(np.array([pref.borda[item] for item in items]), bundles)
+            self.signatures[agent] = list(map(tuple, bordas.tolist()))
+            self.prefixSums[agent] = list(map(tuple, np.cumsum(bordas, axis=-1).tolist()))
+            if pref.cardinal is not None:
+                self.values[agent] = np.array([pref.cardinal[item] for item in items])[bundles].sum(axis=1).tolist()
+        self.cache = {}
+        self.cacheSize = cacheSize
+
+    def relation(self, agent, index1:int, index2:int)->int:
+        """
+        return the flags of the criteria by which the given agent weakly prefers bundle #index1 to bundle #index2.
+        """
+        key = (agent, index1, index2)
+        flags = self.cache.get(key)
+        if flags is not None:
+            return flags
+        (signatures, prefixSums) = (self.signatures[agent], self.prefixSums[agent])
+        flags = weakRelationFlags(signatures[index1], prefixSums[index1], signatures[index2], prefixSums[index2])
+        values = self.values.get(agent)
+        if values is not None and values[index1] >= values[index2]:
+            flags |= CARD
+        if len(self.cache) >= self.cacheSize:
+            self.cache.clear()
+        self.cache[key] = flags
+        return flags
+
+    def flagsOf(self, agent, bundle1, bundle2)->int:
+        """
+        return the flags of the criteria by which the given agent weakly prefers bundle1 to bundle2 (lists of items).
+        """
+        return self.relation(agent, self.bundleIndex(bundle1), self.bundleIndex(bundle2))
+
+    def allocationFlags(self, allocation:dict)->int:
+        """
+        return the verdict flags of the given allocation: a flag is set iff no agent envies another agent by this criterion.
+        """
+        indices = [self.bundleIndex(allocation[agent]) for agent in self.agents]
+        flags = ORDINAL | CARD
+        for (agent, index1) in zip(self.agents, indices):
+            for index2 in indices:
+                if index2 != index1:
+                    flags &= self.relation(agent, index1, index2)
+                    if not flags:
+                        return flags
+        return flags
+
+
+class IncrementalProportionality(object):
+    """
+    The proportionality flags of an allocation that changes by swaps of single items between two agents,
+    as generated by partitions.revolvingDoorPartitions.
+    Each agent's bundle is kept as a bit mask of items, so a swap toggles two bits in the masks of the two affected agents,
+    and only their flags are looked up again in the ProportionalityTables.
+
+    >>> from Pref import Pref
+    >>> from PrefProfile import PrefProfile
+    >>> from partitions import equalPartitions, revolvingDoorPartitions
+    >>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[6,5,4,3,2,1]), "Bob":Pref(ordinal=[5,6,3,4,1,2]), "Carl":Pref(ordinal=[4,3,6,5,2,1])})
+    >>> tables = ProportionalityTables(prefProfile)
+    >>> partitions = revolvingDoorPartitions(prefProfile.agents, prefProfile.items)
+    >>> (allocation, swap) = next(partitions)
+    >>> tracker = IncrementalProportionality(tables, allocation)
+    >>> count = tracker.flags() & NDD == NDD
+    >>> for (allocation, swap) in partitions:
+    ...     tracker.update(swap)
+    ...     count += tracker.flags() & NDD == NDD
+    >>> count == sum(tables.allocationFlags(p) & NDD == NDD for p in equalPartitions(prefProfile.agents, prefProfile.items))
+    True
+    """
+
+    __slots__ = ("tables", "masks", "agentFlags")
+
+    def __init__(self, tables:ProportionalityTables, allocation:dict):
+        self.tables = tables
+        bits = tables.bits
+        self.masks = {agent: sum(bits[item] for item in allocation[agent]) for agent in tables.agents}
+        self.agentFlags = {agent: tables.tables[agent][tables.index[mask]] for (agent, mask) in self.masks.items()}
+
+    def update(self, swap:tuple):
+        """
+        swap: (agent1, item1, agent2, item2) - agent1 gave item1 to agent2 and received item2 instead.
+        """
+        (agent1, item1, agent2, item2) = swap
+        tables = self.tables
+        toggle = tables.bits[item1] | tables.bits[item2]
+        for agent in (agent1, agent2):
+            mask = self.masks[agent] = self.masks[agent] ^ toggle
+            self.agentFlags[agent] = tables.tables[agent][tables.index[mask]]
+
+    def flags(self)->int:
+        """
+        return the verdict flags of the current allocation, as in ProportionalityTables.allocationFlags.
+        """
+        flags = ORDINAL | CARD
+        for agentFlags in self.agentFlags.values():
+            flags &= agentFlags
+        return flags
+
+
+class IncrementalEnvyFreeness(object):
+    """
+    The envy-freeness flags of an allocation that changes by swaps of single items between two agents,
+    as generated by partitions.revolvingDoorPartitions.
+    Each agent's bundle is kept as a bit mask of items, so a swap toggles two bits in the masks of the two affected agents,
+    and only the relations of pairs that involve one of them are looked up again in the EnvyFreenessTables.
+
+    >>> from Pref import Pref
+    >>> from PrefProfile import PrefProfile
+    >>> from partitions import equalPartitions, revolvingDoorPartitions
+    >>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[6,5,4,3,2,1]), "Bob":Pref(ordinal=[5,6,3,4,1,2]), "Carl":Pref(ordinal=[4,3,6,5,2,1])})
+    >>> tables = EnvyFreenessTables(prefProfile)
+    >>> partitions = revolvingDoorPartitions(prefProfile.agents, prefProfile.items)
+    >>> (allocation, swap) = next(partitions)
+    >>> tracker = IncrementalEnvyFreeness(tables, allocation)
+    >>> counts = [tracker.flags() & flag == flag for flag in (NEC, NDD, PDD, POS)]
+    >>> for (allocation, swap) in partitions:
+    ...     tracker.update(swap)
+    ...     counts = [count + (tracker.flags() & flag == flag) for (count, flag) in zip(counts, (NEC, NDD, PDD, POS))]
+    >>> counts == [sum(tables.allocationFlags(p) & flag == flag for p in equalPartitions(prefProfile.agents, prefProfile.items)) for flag in (NEC, NDD, PDD, POS)]
+    True
+    """
+
+    __slots__ = ("tables", "masks", "indices", "relations", "pairsOf")
+
+    def __init__(self, tables:EnvyFreenessTables, allocation:dict):
+        self.tables = tables
+        agents = tables.agents
+        bits = tables.bits
+        self.masks = {agent: sum(bits[item] for item in allocation[agent]) for agent in agents}
+        self.indices = {agent: tables.index[mask] for (agent, mask) in self.masks.items()}
+        pairs = [(agent1, agent2) for agent1 in agents for agent2 in agents if agent1 != agent2]
+        self.pairsOf = {(agent1, agent2): [pair for pair in pairs if agent1 in pair or agent2 in pair]
+                        for (agent1, agent2) in pairs}
+        self.relations = {(agent1, agent2): tables.relation(agent1, self.indices[agent1], self.indices[agent2])
+                          for (agent1, agent2) in pairs}
+
+    def update(self, swap:tuple):
+        """
+        swap: (agent1, item1, agent2, item2) - agent1 gave item1 to agent2 and received item2 instead.
+        """
+        (agent1, item1, agent2, item2) = swap
+        tables = self.tables
+        toggle = tables.bits[item1] | tables.bits[item2]
+        indices = self.indices
+        for agent in (agent1, agent2):
+            mask = self.masks[agent] = self.masks[agent] ^ toggle
+            indices[agent] = tables.index[mask]
+        relations = self.relations
+        cache = tables.cache
+        for pair in self.pairsOf[(agent1, agent2)]:
+            key = (pair[0], indices[pair[0]], indices[pair[1]])
+            flags = cache.get(key)   # inlines the cache lookup of tables.relation, which dominates the running time
+            relations[pair] = tables.relation(*key) if flags is None else flags
+
+    def flags(self)->int:
+        """
+        return the verdict flags of the current allocation, as in EnvyFreenessTables.allocationFlags.
+        """
+        flags = ORDINAL | CARD
+        for relation in self.relations.values():
+            flags &= relation
+        return flags
+
+
+if __name__ == "__main__":
+    import doctest
+    print(doctest.testmod())
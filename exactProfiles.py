@@ -0,0 +1,113 @@
+#!python3
+
+"""
+Exhaustive enumeration of all ordinal profiles of a given size, up to symmetry.
+
+An ordinal verdict that does not depend on the names of the items or on the order of the agents
+(e.g. "an NDDPR allocation exists") is constant on each orbit of profiles under item relabeling and agent permutation.
+So instead of sampling, we can enumerate one representative profile per orbit, weighted by the orbit size,
+and compute the exact probability of the verdict when all rankings are uniformly random and independent
+(the "impartial culture" distribution).
+
+Date:   2026-10
+"""
+
+from itertools import combinations_with_replacement, permutations
+from math import factorial
+from collections import Counter
+from Pref import Pref
+from PrefProfile import PrefProfile
+
+
+def canonicalForm(rankings:tuple)->tuple:
+    """
+    return the canonical form of the given rankings (a tuple of permutations of 0,...,m-1):
+    the minimum, over all choices of an anchor agent, of the sorted rankings of the other agents,
+    after relabeling the items in the order of the anchor's ranking.
+    Two profiles are equivalent under item relabeling and agent permutation iff they have the same canonical form.
+
+    >>> canonicalForm(((0,1,2), (2,0,1)))
+    ((1, 2, 0),)
+    >>> canonicalForm(((2,0,1), (0,1,2)))
+    ((1, 2, 0),)
+    """
+    forms = []
+    for anchor in range(len(rankings)):
+        labels = [0] * len(rankings[anchor])
+        for (label, item) in enumerate(rankings[anchor]):
+            labels[item] = label
+        forms.append(tuple(sorted(
+            tuple(labels[item] for item in ranking)
+            for (agent, ranking) in enumerate(rankings) if agent != anchor)))
+    return min(forms)
+
+
+def orbits(agentCount:int, itemCount:int):
+    """
+    Generate a pair (rankings, weight) for each orbit of ordinal profiles with the given numbers of agents and items,
+    where 'rankings' is a representative profile (a tuple of agentCount permutations of 0,...,itemCount-1),
+    and 'weight' is the number of profiles in its orbit. The weights sum to (itemCount!)^agentCount.
+
+    The first agent's ranking is fixed to the identity (this accounts for item relabeling),
+    and the other agents' rankings are enumerated as a multiset (this accounts for permuting them).
+    Representatives that differ only by the choice of the first agent are then merged by their canonicalForm.
+
+    Note: the representatives are not generated directly - all C(m!+n-2, n-1) multisets of the other agents' rankings
+    are enumerated and canonicalized (about (m!)^(n-1)/(n-1)! of them, for n agents and m items),
+    and only the checks are run once per orbit. So the running time grows like the number of multisets, not the number of orbits.
+    E.g. 2 agents with 8 items (20542 orbits) take about half a second, 3 agents with 6 items (86787 orbits) about 6 seconds,
+    but 3 agents with 9 items (about 6.6e10 multisets) are out of reach.
+
+    >>> list(orbits(2, 2))
+    [(((0, 1), (0, 1)), 2), (((0, 1), (1, 0)), 2)]
+    >>> sum(weight for (rankings, weight) in orbits(3, 3))
+    216
+    >>> len(list(orbits(3, 3)))
+    10
+    """
+    identity = tuple(range(itemCount))
+    itemPermutations = factorial(itemCount)
+    otherAgentPermutations = factorial(agentCount - 1)
+    weights = {}
+    for others in combinations_with_replacement(permutations(identity), agentCount - 1):
+        weight = itemPermutations * otherAgentPermutations
+        for multiplicity in Counter(others).values():
+            weight //= factorial(multiplicity)
+        key = canonicalForm((identity,) + others)
+        weights[key] = weights.get(key, 0) + weight
+    for (others, weight) in weights.items():
+        yield ((identity,) + others, weight)
+
+
+def exactAverage(checkSingleProfile, agents:list, items:list) -> list:
+    """
+    Calculate the exact average of checkSingleProfile over all ordinal profiles with the given agents and items,
+    when all rankings are uniformly random and independent.
+
+    :param checkSingleProfile: a function that takes a single PrefProfile object with ordinal preferences,
+       and returns a vector of numbers describing it. It must be invariant to item relabeling and agent permutation.
+    :return: a list of floats, one per number returned by checkSingleProfile.
+
+    >>> from itemAssignment import isNDDProportional
+    >>> from partitions import equalPartitions
+    >>> nddExists = lambda profile: [any(isNDDProportional(profile, allocation) for allocation in equalPartitions(profile.agents, profile.items))]
+    >>> exactAverage(nddExists, ["A","B"], [1,2])    # NDDPR exists iff the best items are different
+    [0.5]
+    >>> exactAverage(nddExists, ["A","B","C"], [1,2,3])
+    [0.2222222222222222]
+    """
+    totals = None
+    totalWeight = 0
+    for (rankings, weight) in orbits(len(agents), len(items)):
+        profile = PrefProfile({
+            agent: Pref(ordinal=[items[item] for item in ranking])
+            for (agent, ranking) in zip(agents, rankings)})
+        verdicts = [weight * value for value in checkSingleProfile(profile)]
+        totals = verdicts if totals is None else [total + verdict for (total, verdict) in zip(totals, verdicts)]
+        totalWeight += weight
+    return [total / totalWeight for total in totals]
+
+
+if __name__ == "__main__":
+    import doctest
+    print(doctest.testmod())
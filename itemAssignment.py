@@ -6,20 +6,22 @@ Author: Erel Segai-Halevi
 Date:   2017-02
 """
 
-from Pref import Pref
+from Pref import Pref, RankMask
 from PrefProfile import PrefProfile
-from partitions import equalPartitions
-import copy
+from partitions import equalPartitions, symmetricEqualPartitions
+from bundleVerdicts import ProportionalityTables, weakRelationFlags, impliedFlags, implicationCounters, NEC, NDD, PDD, POS, CARD, ORDINAL
 import itertools
-from operator import itemgetter
+from operator import itemgetter, lt
 import dicttools  # required for the doctests
 import random
+import numpy as np
 
 
-def findNDDProportionalAllocation(prefProfile):
+def findNDDProportionalAllocation(prefProfile, crossCheck:bool=False):
     """
     INPUT:
     prefProfile: a PrefProfile object.
+    crossCheck: if True, the result is verified against a brute-force search over all equal partitions.
 
     OUTPUT:
     If an NDDPR allocation exists - it is returned as a dictionary that maps agents to their bundles.
@@ -33,7 +35,16 @@ def findNDDProportionalAllocation(prefProfile):
     >>> allocation = findNDDProportionalAllocation(prefProfile)
     >>> dicttools.stringify(allocation)
     '{Alice:[6, 1], Bob:[5, 2], Carl:[4, 3]}'
+    >>> findNDDProportionalAllocation(prefProfile, crossCheck=True) == allocation
+    True
     """
+    allocation = _findNDDProportionalRoundRobin(prefProfile)
+    if crossCheck:
+        _crossCheck(prefProfile, allocation, _bruteForceAllocation(prefProfile, isNDDProportional), isNDDProportional)
+    return allocation
+
+
+def _findNDDProportionalRoundRobin(prefProfile):
     itemsPerAgent = prefProfile.itemCount // prefProfile.agentCount
 
     # First necessary condition for NDDPR allocation:  it is possible to give each agent the same num of items:
@@ -46,13 +57,14 @@ def findNDDProportionalAllocation(prefProfile):
         return None
 
     allocation = {agent:list() for agent in prefProfile.agents}
-    prefProfile = copy.deepcopy(prefProfile)
+    remaining = prefProfile.rankingProfile().remaining()
+    agents = list(prefProfile.agents)
     for iteration in range(itemsPerAgent):
-        for agent in prefProfile.agents:
-            item = prefProfile.agentsToPrefs[agent].bestItem()
+        for agent in agents:
+            item = remaining.bestItem(agent)
             allocation[agent].append(item)
-            prefProfile.removeItem(item)
-        prefProfile.agents.reverse()
+            remaining.removeItem(item)
+        agents.reverse()
     return allocation
 
 def findABCCBAAllocation(prefProfile:PrefProfile):
@@ -76,15 +88,14 @@ def findABCCBAAllocation(prefProfile:PrefProfile):
     """
     itemsPerAgent = prefProfile.itemCount // prefProfile.agentCount
     allocation = {agent:list() for agent in prefProfile.agents}
-    prefProfile = copy.deepcopy(prefProfile)
+    remaining = prefProfile.rankingProfile().remaining()
     agents = sorted(prefProfile.agents)
     for iteration in range(itemsPerAgent):
         for agent in agents:
             # print(" choosing: "+agent)
-            pref = prefProfile.agentsToPrefs[agent]
-            item = pref.bestItem()
+            item = remaining.bestItem(agent)
             allocation[agent].append(item)
-            prefProfile.removeItem(item)
+            remaining.removeItem(item)
         agents.reverse()
     return allocation
 
@@ -109,22 +120,22 @@ def findABCCBAAllocation(prefProfile:PrefProfile):
     """
     itemsPerAgent = prefProfile.itemCount // prefProfile.agentCount
     allocation = {agent:list() for agent in prefProfile.agents}
-    prefProfile = copy.deepcopy(prefProfile)
+    remaining = prefProfile.rankingProfile().remaining()
     agents = sorted(prefProfile.agents)
     for iteration in range(itemsPerAgent):
         for agent in agents:
             # print(" choosing: "+agent)
-            pref = prefProfile.agentsToPrefs[agent]
-            item = pref.bestItem()
+            item = remaining.bestItem(agent)
             allocation[agent].append(item)
-            prefProfile.removeItem(item)
+            remaining.removeItem(item)
         agents.reverse()
     return allocation
 
-def findABCRandomAllocation(prefProfile:PrefProfile):
+def findABCRandomAllocation(prefProfile:PrefProfile, rng=None):
     """
     INPUT:
     prefProfile: a PrefProfile object representing several agents with ordinal valuations.
+    rng: a numpy.random.Generator for choosing the random items. If None, the global state of the 'random' module is used.
 
     OUTPUT:
     An allocation where each agent receives his best item (if possible), and the remaining items are allocated at random.
@@ -141,44 +152,69 @@ def findABCRandomAllocation(prefProfile:PrefProfile):
     4
     >>> allocation["Carl"][0]
     5
-
+    >>> findABCRandomAllocation(prefProfile, rng=np.random.default_rng(1)) == findABCRandomAllocation(prefProfile, rng=np.random.default_rng(1))
+    True
     """
     itemsPerAgent = prefProfile.itemCount // prefProfile.agentCount
     allocation = {agent:list() for agent in prefProfile.agents}
-    prefProfile = copy.deepcopy(prefProfile)
+    remaining = prefProfile.rankingProfile().remaining()
     agents = sorted(prefProfile.agents)
 
     for agent in agents:
-        pref = prefProfile.agentsToPrefs[agent]
-        item = pref.bestItem()
+        item = remaining.bestItem(agent)
         allocation[agent].append(item)
-        prefProfile.removeItem(item)
+        remaining.removeItem(item)
 
     for iteration in range(itemsPerAgent-1):
         for agent in agents:
-            item = random.choice(prefProfile.items)
+            items = remaining.items
+            item = random.choice(items) if rng is None else items[rng.integers(len(items))]
             allocation[agent].append(item)
-            prefProfile.removeItem(item)
+            remaining.removeItem(item)
 
     return allocation
 
 
-def findNecessarilyFairAllocation(prefProfile:PrefProfile, isFair:bool):
+def findNecessarilyFairAllocation(prefProfile:PrefProfile, isFair:bool, criterion=None):
     """
     INPUT:
     prefProfile: a PrefProfile with ordinal rankings.
-    Currently, at most 3 agents are supported.
     isFair: a boolean-valued function that checks whether an allocation is fair  (prop/ef)
+    criterion: isNecessarilyProportional or isNecessarilyEnvyFree, if isFair implies it - its prefix conditions are then used for pruning.
+       Default: isFair itself, if it is one of these functions. Otherwise, each agent just gets its best item, as every necessarily-fair allocation must.
 
     OUTPUT:
     A necessarily-fair allocation (map of agents to bundles), if it exists.
+    Each bundle is ordered by its agent's ranking.
+    When several necessarily-fair allocations exist, the one returned is the first in the search order below;
+    it may differ from the first one in the order of partitions.equalPartitions.
+
+    ALGORITHM:
+    A backtracking search. The items are assigned one by one, ordered by their best rank among all agents,
+    and each item is offered first to the agents who rank it highest.
+    For an agent, let own(t) and other(t) be the numbers of items among its t best items
+    that are given to itself and to some other agent. With n agents and equal bundles, the agent's bundle is
+    necessarily-proportional iff own(t)*n >= t for all t, and necessarily at least as good as the other agent's bundle iff own(t) >= other(t) for all t.
+    In a partial allocation, own(t) is at most the items already given to the agent plus the unassigned items it can still get,
+    and other(t) is at least the items already given to the other agent;
+    the search backtracks as soon as one of these bounds violates a condition.
+    The prefix conditions are used when the criterion is isNecessarilyProportional or isNecessarilyEnvyFree
+    (with equal bundles, necessary envy-freeness implies necessary proportionality);
+    for other criteria, only complete allocations are checked.
+
+    A wrapped criterion gets the same pruning if it is given explicitly:
+
+    >>> prefProfile = PrefProfile({"A":Pref(ordinal=[1,5,2,3,4,6,7,8]), "B":Pref(ordinal=[2,6,1,3,4,5,7,8]), "C":Pref(ordinal=[3,7,1,2,4,5,6,8]), "D":Pref(ordinal=[4,8,1,2,3,5,6,7])})
+    >>> isFair = lambda prefProfile, allocation: isNecessarilyEnvyFree(prefProfile, allocation)
+    >>> allocation = findNecessarilyFairAllocation(prefProfile, isFair, criterion=isNecessarilyEnvyFree)
+    >>> [allocation[agent] for agent in "ABCD"]
+    [[1, 5], [2, 6], [3, 7], [4, 8]]
+    >>> isFair(prefProfile, findNecessarilyFairAllocation(prefProfile, isFair))
+    True
 
-    EXAMPLES: see below, findNecessarilyProportionalAllocation
+    EXAMPLES: see below, findNecessarilyProportionalAllocation and findNecessarilyEnvyFreeAllocation
     """
-
     agentCount = prefProfile.agentCount
-    if agentCount>3:
-        raise ValueError("Currently findNecessarilyFairAllocation works only for at most three agents")
     itemCount = prefProfile.itemCount
     itemsPerAgent = itemCount // agentCount
 
@@ -186,67 +222,159 @@ def findNecessarilyFairAllocation(prefProfile:PrefProfile, isFair:bool):
     if itemsPerAgent * agentCount < itemCount:
         return None
 
+    if criterion is None:
+        criterion = isFair
+    envyFree = criterion is isNecessarilyEnvyFree
+    proportional = envyFree or criterion is isNecessarilyProportional
+
     # Second necessary condition for necessarily-fair allocation: it is possible to give each agent its best item.
-    bestItems = {agent:prefProfile.agentsToPrefs[agent].bestItem() for agent in prefProfile.agents}
-    if len(set(bestItems.values())) < agentCount:
+    if len(prefProfile.bestItems()) < agentCount:
         return None
 
-    prof = copy.deepcopy(prefProfile)
-    for agent in prof.agents:
-        prof.removeItem(bestItems[agent])
-
-    itemsPerAgent -= 1
-
-    agents = prof.agents;
-    # Try all combinations of the other items:
-    agent0 = agents[0]
-    agent1 = agents[1]
-    if prof.agentCount>=3: agent2 = agents[2]
-    for p in equalPartitions(agents, prof.items):
-        allocation = {
-            agent0: [bestItems[agent0]] + p[agent0],
-            agent1: [bestItems[agent1]] + p[agent1]
-            }
-        if prof.agentCount>=3:
-            allocation[agent2] = [bestItems[agent2]] + p[agent2]
-        if isFair(prefProfile,allocation):
-            return allocation
-    return None
-
-def findNecessarilyProportionalAllocation(prefProfile):
+    agents = prefProfile.agents
+    rankings = [prefProfile.agentsToPrefs[agent].ordinal for agent in agents]
+    ranks = [{item: rank for (rank, item) in enumerate(ranking)} for ranking in rankings]
+    items = sorted(prefProfile.items, key=lambda item: sorted(rank[item] for rank in ranks))
+    candidates = {item: sorted(range(agentCount), key=lambda agent: ranks[agent][item]) for item in items}
+    for (agent, ranking) in enumerate(rankings):
+        candidates[ranking[0]] = [agent]    # each agent must get its best item
+    owners = {}
+    sizes = [0] * agentCount
+
+    def isPossible(agent:int)->bool:
+        capacity = itemsPerAgent - sizes[agent]
+        own = free = maxOther = 0
+        others = [0] * agentCount
+        for (t, item) in enumerate(rankings[agent], 1):
+            owner = owners.get(item)
+            if owner is None:
+                free += 1
+            elif owner == agent:
+                own += 1
+            else:
+                others[owner] += 1
+                maxOther = max(maxOther, others[owner])
+            maxOwn = own + min(free, capacity)
+            if maxOwn * agentCount < t or (envyFree and maxOwn < maxOther):
+                return False
+        return True
+
+    def allocation()->dict:
+        return {agent: [item for item in ranking if owners[item] == index]
+                for (index, (agent, ranking)) in enumerate(zip(agents, rankings))}
+
+    def search(index:int)->bool:
+        if index == itemCount:
+            return isFair(prefProfile, allocation())
+        item = items[index]
+        for agent in candidates[item]:
+            if sizes[agent] == itemsPerAgent: continue
+            owners[item] = agent
+            sizes[agent] += 1
+            if (not proportional or all(isPossible(other) for other in range(agentCount))) and search(index + 1):
+                return True
+            sizes[agent] -= 1
+            del owners[item]
+        return False
+
+    return allocation() if search(0) else None
+
+
+def _bruteForceAllocation(prefProfile, isFair):
+    """
+    return the first equal partition that satisfies isFair, or None. Used for cross-checking the faster searches.
+    """
+    return next((allocation for allocation in equalPartitions(prefProfile.agents, prefProfile.items)
+                 if isFair(prefProfile, allocation)), None)
+
+def findNecessarilyProportionalAllocation(prefProfile, crossCheck:bool=False):
     """
     INPUT:
     prefProfile: a PrefProfile with ordinal ranking.
-    Currently, at most 3 agents are supported.
+    crossCheck: if True, the result is verified against a brute-force search over all equal partitions.
 
     OUTPUT:
     A necessarily-proportional allocation (map of agents to bundles), if it exists.
+    Each bundle is ordered by its agent's ranking.
+
+    ALGORITHM:
+    With m=k*n items, a bundle is necessarily-proportional for an agent iff,
+    for every j=0,...,k-1, its (j+1)-th best item is among the agent's j*n+1 best items.
+    So an allocation is necessarily-proportional iff it is a perfect matching between the items and the
+    "slots" (agent,j), where slot (agent,j) can take the agent's j*n+1 best items.
+    Such a matching is found by augmenting paths in polynomial time, without enumerating partitions.
 
     >>> prefProfile = PrefProfile({"Alice":Pref(cardinal={6:6,5:5,4:4,3:3,2:2,1:1}), "Bob":Pref(cardinal={6:6,5:5,4:4,3:3,2:2,1:1})})
     >>> findNecessarilyProportionalAllocation(prefProfile) is None
     True
 
     >>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[6,5,4,3,2,1]), "Bob":Pref(ordinal=[5,6,3,4,1,2])})
-    >>> allocation = findNecessarilyProportionalAllocation(prefProfile)
+    >>> allocation = findNecessarilyProportionalAllocation(prefProfile, crossCheck=True)
     >>> allocation['Alice']
     [6, 4, 2]
     >>> allocation['Bob']
-    [5, 1, 3]
+    [5, 3, 1]
 
     >>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[2,1,3,4,6,5]), "Bob":Pref(ordinal=[4,3,6,5,2,1])})
-    >>> allocation = findNecessarilyProportionalAllocation(prefProfile)
+    >>> allocation = findNecessarilyProportionalAllocation(prefProfile, crossCheck=True)
     >>> allocation['Alice']
-    [2, 3, 1]
+    [2, 1, 3]
     >>> allocation['Bob']
-    [4, 5, 6]
+    [4, 6, 5]
+
+    >>> prefProfile = PrefProfile({"A":Pref(ordinal=[1,5,2,3,4,6,7,8]), "B":Pref(ordinal=[2,6,1,3,4,5,7,8]), "C":Pref(ordinal=[3,7,1,2,4,5,6,8]), "D":Pref(ordinal=[4,8,1,2,3,5,6,7])})
+    >>> allocation = findNecessarilyProportionalAllocation(prefProfile, crossCheck=True)
+    >>> [allocation[agent] for agent in "ABCD"]
+    [[1, 5], [2, 6], [3, 7], [4, 8]]
     """
-    return findNecessarilyFairAllocation(prefProfile, isNecessarilyProportional)
+    allocation = _findNecessarilyProportionalMatching(prefProfile)
+    if crossCheck:
+        _crossCheck(prefProfile, allocation, _bruteForceAllocation(prefProfile, isNecessarilyProportional), isNecessarilyProportional)
+    return allocation
 
-def findNecessarilyEnvyFreeAllocation(prefProfile):
+
+def _findNecessarilyProportionalMatching(prefProfile):
+    agentCount = prefProfile.agentCount
+    itemsPerAgent = prefProfile.itemCount // agentCount
+    if itemsPerAgent * agentCount < prefProfile.itemCount:
+        return None
+    rankings = {agent: pref.ordinal for (agent, pref) in prefProfile.agentsToPrefs.items()}
+    # The most constrained slots (the agents' best items) are matched first:
+    slots = [(agent, j) for j in range(itemsPerAgent) for agent in prefProfile.agents]
+    slotOfItem = {}
+
+    def augment(slot:int, visited:set)->bool:
+        (agent, j) = slots[slot]
+        for item in rankings[agent][:j * agentCount + 1]:
+            if item in visited: continue
+            visited.add(item)
+            if item not in slotOfItem or augment(slotOfItem[item], visited):
+                slotOfItem[item] = slot
+                return True
+        return False
+
+    for slot in range(len(slots)):
+        if not augment(slot, set()):
+            return None
+    return {agent: [item for item in ranking if slots[slotOfItem[item]][0] == agent]
+            for (agent, ranking) in rankings.items()}
+
+
+def _crossCheck(prefProfile, allocation, bruteForceAllocation, isFair):
+    """
+    Verify the result of a polynomial-time search against a brute-force search: both must agree on existence,
+    and the allocation must be fair.
+    """
+    if (allocation is None) != (bruteForceAllocation is None):
+        raise AssertionError("Existence mismatch for {}: {} vs. brute-force {}".format(prefProfile, allocation, bruteForceAllocation))
+    if allocation is not None and not isFair(prefProfile, allocation):
+        raise AssertionError("Unfair allocation for {}: {}".format(prefProfile, allocation))
+
+def findNecessarilyEnvyFreeAllocation(prefProfile, crossCheck:bool=False):
     """
     INPUT:
     prefProfile: a PrefProfile with ordinal ranking.
-    Currently, at most 3 agents are supported.
+    crossCheck: if True, the result is verified against a brute-force search over all equal partitions.
 
     OUTPUT:
     A necessarily-envy-free allocation (map of agents to bundles), if it exists.
@@ -256,20 +384,186 @@ def findNecessarilyEnvyFreeAllocation(prefProfile):
     True
 
     >>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[6,5,4,3,2,1]), "Bob":Pref(ordinal=[5,6,3,4,1,2])})
-    >>> allocation = findNecessarilyEnvyFreeAllocation(prefProfile)
+    >>> allocation = findNecessarilyEnvyFreeAllocation(prefProfile, crossCheck=True)
     >>> allocation['Alice']
     [6, 4, 2]
     >>> allocation['Bob']
-    [5, 1, 3]
+    [5, 3, 1]
 
     >>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[2,1,3,4,6,5]), "Bob":Pref(ordinal=[4,3,6,5,2,1])})
-    >>> allocation = findNecessarilyEnvyFreeAllocation(prefProfile)
+    >>> allocation = findNecessarilyEnvyFreeAllocation(prefProfile, crossCheck=True)
+    >>> allocation['Alice']
+    [2, 1, 6]
+    >>> allocation['Bob']
+    [4, 3, 5]
+
+    This is not the first necessarily-envy-free allocation in the order of partitions.equalPartitions, which is:
+
+    >>> isNecessarilyEnvyFree(prefProfile, {"Alice":[2,1,3], "Bob":[4,6,5]})
+    True
+
+    >>> prefProfile = PrefProfile({"A":Pref(ordinal=[1,5,2,3,4,6,7,8]), "B":Pref(ordinal=[2,6,1,3,4,5,7,8]), "C":Pref(ordinal=[3,7,1,2,4,5,6,8]), "D":Pref(ordinal=[4,8,1,2,3,5,6,7])})
+    >>> allocation = findNecessarilyEnvyFreeAllocation(prefProfile, crossCheck=True)
+    >>> [allocation[agent] for agent in "ABCD"]
+    [[1, 5], [2, 6], [3, 7], [4, 8]]
+    """
+    allocation = findNecessarilyFairAllocation(prefProfile, isNecessarilyEnvyFree)
+    if crossCheck:
+        _crossCheck(prefProfile, allocation, _bruteForceAllocation(prefProfile, isNecessarilyEnvyFree), isNecessarilyEnvyFree)
+    return allocation
+
+
+def findNDDEnvyFreeAllocation(prefProfile, crossCheck:bool=False):
+    """
+    INPUT:
+    prefProfile: a PrefProfile with ordinal ranking.
+    crossCheck: if True, the result is verified against a brute-force search over all equal partitions.
+
+    OUTPUT:
+    An NDD-envy-free allocation (map of agents to bundles), if it exists; otherwise None.
+    Each bundle is ordered by its agent's ranking.
+
+    ALGORITHM:
+    A backtracking search, like findNecessarilyFairAllocation.
+    With equal bundles, agent a does not NDD-envy agent b iff, for every j, the sum of the j highest Borda scores
+    (by a's ranking) in a's bundle is at least the same sum in b's bundle.
+    In a partial allocation, the first sum is at most that of a's items plus the best unassigned items by a's ranking,
+    and the second sum is at least that of b's items plus the worst unassigned items by a's ranking.
+    The search backtracks as soon as, for some ordered pair of agents, the upper bound is below the lower bound for some j.
+
+    >>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[6,5,4,3,2,1]), "Bob":Pref(ordinal=[6,5,4,3,2,1])})
+    >>> findNDDEnvyFreeAllocation(prefProfile, crossCheck=True) is None
+    True
+
+    >>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[6,5,4,3,2,1]), "Bob":Pref(ordinal=[5,6,3,4,1,2])})
+    >>> allocation = findNDDEnvyFreeAllocation(prefProfile, crossCheck=True)
     >>> allocation['Alice']
-    [2, 3, 1]
+    [6, 4, 2]
     >>> allocation['Bob']
-    [4, 5, 6]
+    [5, 3, 1]
+
+    >>> prefProfile = PrefProfile({"A":Pref(ordinal=[1,2,3,4,5,6]), "B":Pref(ordinal=[2,1,3,4,5,6]), "C":Pref(ordinal=[3,1,2,4,5,6])})
+    >>> findNecessarilyEnvyFreeAllocation(prefProfile) is None
+    True
+    >>> allocation = findNDDEnvyFreeAllocation(prefProfile, crossCheck=True)
+    >>> [allocation[agent] for agent in "ABC"]
+    [[1, 5], [2, 4], [3, 6]]
     """
-    return findNecessarilyFairAllocation(prefProfile, isNecessarilyEnvyFree)
+    allocation = _findNDDEnvyFreeSearch(prefProfile)
+    if crossCheck:
+        _crossCheck(prefProfile, allocation, _bruteForceAllocation(prefProfile, isNDDEnvyFree), isNDDEnvyFree)
+    return allocation
+
+
+def _findNDDEnvyFreeSearch(prefProfile):
+    agentCount = prefProfile.agentCount
+    itemCount = prefProfile.itemCount
+    itemsPerAgent = itemCount // agentCount
+
+    # First necessary condition for NDDEF allocation:  it is possible to give each agent the same num of items:
+    if itemsPerAgent * agentCount < itemCount:
+        return None
+
+    # Second necessary condition for NDDEF allocation: it is possible to give each agent its best item.
+    if len(prefProfile.bestItems()) < agentCount:
+        return None
+
+    agents = prefProfile.agents
+    rankings = [prefProfile.agentsToPrefs[agent].ordinal for agent in agents]
+    ranks = [{item: rank for (rank, item) in enumerate(ranking)} for ranking in rankings]
+    items = sorted(prefProfile.items, key=lambda item: sorted(rank[item] for rank in ranks))
+    candidates = {item: sorted(range(agentCount), key=lambda agent: ranks[agent][item]) for item in items}
+    owners = {}
+    sizes = [0] * agentCount
+
+    def isPossible(agent:int)->bool:
+        # The Borda scores of the agents' items and of the unassigned items, by the agent's ranking, in decreasing order:
+        owned = [[] for _ in range(agentCount)]
+        free = []
+        for (rank, item) in enumerate(rankings[agent]):
+            owner = owners.get(item)
+            (free if owner is None else owned[owner]).append(itemCount - rank)
+        best = sorted(owned[agent] + free[:itemsPerAgent - sizes[agent]], reverse=True)
+        upperSums = list(itertools.accumulate(best))
+        for other in range(agentCount):
+            if other == agent: continue
+            worst = sorted(owned[other] + free[len(free) - itemsPerAgent + sizes[other]:], reverse=True)
+            if any(map(lt, upperSums, itertools.accumulate(worst))):
+                return False
+        return True
+
+    def allocation()->dict:
+        return {agent: [item for item in ranking if owners[item] == index]
+                for (index, (agent, ranking)) in enumerate(zip(agents, rankings))}
+
+    def search(index:int)->bool:
+        if index == itemCount:
+            return isNDDEnvyFree(prefProfile, allocation())
+        item = items[index]
+        for agent in candidates[item]:
+            if sizes[agent] == itemsPerAgent: continue
+            owners[item] = agent
+            sizes[agent] += 1
+            if all(isPossible(other) for other in range(agentCount)) and search(index + 1):
+                return True
+            sizes[agent] -= 1
+            del owners[item]
+        return False
+
+    return allocation() if search(0) else None
+
+
+def countFairAllocations(prefProfile:PrefProfile, isFair, bundleFilter=None)->int:
+    """
+    INPUT:
+    prefProfile: a PrefProfile object.
+    isFair: a boolean-valued function that checks whether an allocation is fair, based only on the agents' rankings
+       (e.g. isNDDProportional). It must not be a cardinal check, since agents with identical rankings may have different values.
+    bundleFilter (optional): a per-agent necessary condition for fairness, e.g. ProportionalBundleFilter(prefProfile, NDD) for isNDDProportional;
+       see partitions.equalPartitions.
+
+    OUTPUT:
+    The number of equal allocations that are fair.
+    Allocations that differ only by permuting the bundles of agents with identical rankings are checked only once
+    (see partitions.symmetricEqualPartitions).
+
+    >>> prefProfile = PrefProfile({"Alice":Pref([6,5,4,3,2,1]), "Bob":Pref([6,5,4,3,2,1]), "Carl":Pref([5,6,4,3,2,1])})
+    >>> countFairAllocations(prefProfile, isPossiblyProportional)
+    36
+    >>> sum(isPossiblyProportional(prefProfile, allocation) for allocation in equalPartitions(prefProfile.agents, prefProfile.items))
+    36
+    >>> countFairAllocations(prefProfile, isPossiblyProportional, ProportionalBundleFilter(prefProfile, POS))
+    36
+    """
+    return sum(weight
+        for (allocation, weight) in symmetricEqualPartitions(prefProfile.agents, prefProfile.items, prefProfile.identicalAgentGroups(), bundleFilter)
+        if isFair(prefProfile, allocation))
+
+
+class ProportionalBundleFilter(object):
+    """
+    A bundle filter for partitions.equalPartitions, that accepts a bundle for an agent
+    iff the bundle satisfies, for this agent, at least one of the proportionality criteria in self.flags (bundleVerdicts flags).
+    Since every agent's bundle in a proportional allocation must pass, the filter prunes no allocation that satisfies any of these criteria.
+    The verdicts are looked up in a bundleVerdicts.ProportionalityTables, computed once.
+    The flags may be changed while the partitions are generated (see existenceFlags).
+
+    >>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[6,5,4,3,2,1]), "Bob":Pref(ordinal=[5,6,3,4,1,2])})
+    >>> bundleFilter = ProportionalBundleFilter(prefProfile, NDD)
+    >>> bundleFilter("Alice", [6,3,2]), bundleFilter("Alice", [5,4,3])
+    (True, False)
+    >>> len(list(equalPartitions(prefProfile.agents, prefProfile.items, bundleFilter)))
+    3
+    """
+
+    __slots__ = ("tables", "flags")
+
+    def __init__(self, prefProfile:PrefProfile, flags:int):
+        self.tables = ProportionalityTables(prefProfile)
+        self.flags = flags
+
+    def __call__(self, agent, bundle)->bool:
+        return bool(self.tables.flagsOf(agent, bundle) & self.flags)
 
 
 def isCardinallyProportional(prefProfile, allocation):
@@ -335,7 +629,11 @@ def duplicateEachItem(bundle:list, times:int):
     """
     >>> list(duplicateEachItem([2,1,3],3))
     [2, 2, 2, 1, 1, 1, 3, 3, 3]
+    >>> duplicateEachItem(RankMask(0b101),3)
+    RankMask(0b101, copies=3)
     """
+    if isinstance(bundle, RankMask):
+        return RankMask(bundle, bundle.copies*times)
     return itertools.chain.from_iterable([item]*times for item in bundle)
 
 
@@ -344,7 +642,7 @@ def isProportional(prefProfile:PrefProfile, allocation:dict, isWeaklyBetter):
     INPUT:
     prefProfile: a dictionary that maps agents to their Pref object.
     allocation: a dictionary that maps agents to their bundles.
-    isWeaklyBetter: a boolean function on Pref and two bundles. Returns True iff bundle1 >= bundle2 according to the Pref.ordinal ranking.
+    isWeaklyBetter: a boolean function on Pref and two bundles (given as RankMasks). Returns True iff bundle1 >= bundle2 according to the Pref.ordinal ranking.
 
     OUTPUT:
     True iff the given allocation is proportional according to the agents' ordinal ranking.
@@ -387,9 +685,9 @@ def isProportional(prefProfile:PrefProfile, allocation:dict, isWeaklyBetter):
     """
     agentCount = prefProfile.agentCount
     for (agent,pref) in prefProfile.agentsToPrefs.items():
-        bundle = allocation[agent]
-        duplicateBundle = list(duplicateEachItem(bundle, agentCount))
-        if not isWeaklyBetter(pref, duplicateBundle, pref.ordinal):
+        bundle = pref.rankMaskOf(allocation[agent])
+        duplicateBundle = duplicateEachItem(bundle, agentCount)
+        if not isWeaklyBetter(pref, duplicateBundle, pref.rankMaskOf(pref.ordinal)):
             return False
     return True
 
@@ -412,7 +710,7 @@ def isEnvyFree(prefProfile, allocation, isWeaklyBetter):
     INPUT:
     prefProfile: a PrefProfile object.
     allocation: a dictionary that maps agents to their bundles.
-    isWeaklyBetter: a boolean function on Pref and two bundles. Returns True iff bundle1 >= bundle2 according to the Pref.ordinal ranking.
+    isWeaklyBetter: a boolean function on Pref and two bundles (given as RankMasks). Returns True iff bundle1 >= bundle2 according to the Pref.ordinal ranking.
 
     OUTPUT:
     True iff the given allocation is envy-free according to the agents' ordinal ranking.
@@ -445,10 +743,10 @@ def isEnvyFree(prefProfile, allocation, isWeaklyBetter):
     itemCount = prefProfile.itemCount
     agentCount = prefProfile.agentCount
     for (agent1,pref1) in prefProfile.agentsToPrefs.items():
-        bundle1 = allocation[agent1]
+        bundle1 = pref1.rankMaskOf(allocation[agent1])
         for agent2 in prefProfile.agents:
             if agent2==agent1: continue
-            bundle2 = allocation[agent2]
+            bundle2 = pref1.rankMaskOf(allocation[agent2])
             if not isWeaklyBetter(pref1, bundle1, bundle2):
                 return False
     return True
@@ -478,6 +776,124 @@ def isPDDEnvyFree(prefProfile, allocation):
     # https://arxiv.org/abs/1705.07993
 
 
+def proportionalityFlags(prefProfile:PrefProfile, allocation:dict, flags:int=ORDINAL|CARD)->int:
+    """
+    A fused version of isNecessarilyProportional, isNDDProportional, isPDDProportional, isPossiblyProportional
+    and isCardinallyProportional: the Borda scores of each agent's bundle and their prefix sums are computed once,
+    and all verdicts are derived from them.
+
+    flags: the criteria to check (default: all). The evaluation stops as soon as none of them can hold.
+
+    OUTPUT: the bit flags (bundleVerdicts.NEC, NDD, PDD, POS, CARD) of the criteria satisfied by the given allocation.
+    CARD is set only if all agents have cardinal utilities.
+
+    >>> prefProfile = PrefProfile({"Alice":Pref(cardinal={6:6,5:5,4:4,3:3,2:2,1:1}), "Bob":Pref(cardinal={5:6,6:5,3:4,4:3,1:2,2:1})})
+    >>> flags = proportionalityFlags(prefProfile, {"Alice":[6,3,2], "Bob":[5,4,1]})
+    >>> bool(flags & NEC), bool(flags & NDD), bool(flags & PDD), bool(flags & POS), bool(flags & CARD)
+    (False, True, True, True, True)
+    >>> proportionalityFlags(prefProfile, {"Alice":[6,4], "Bob":[5,3]}) == PDD | POS
+    True
+    """
+    agentCount = prefProfile.agentCount
+    allBordas = list(range(prefProfile.itemCount, 0, -1))
+    allSums = list(itertools.accumulate(allBordas))
+    for (agent, pref) in prefProfile.agentsToPrefs.items():
+        bundle = allocation[agent]
+        agentFlags = 0
+        if flags & ORDINAL:
+            duplicateBordas = [borda for borda in pref.bordasOf(bundle) for copy in range(agentCount)]
+            agentFlags = weakRelationFlags(duplicateBordas, list(itertools.accumulate(duplicateBordas)), allBordas, allSums, flags)
+        if flags & CARD and pref.cardinal is not None and pref.valueOf(bundle) * agentCount >= pref.valueOf(pref.ordinal):
+            agentFlags |= CARD
+        flags &= agentFlags
+        if not flags:
+            break
+    return flags
+
+
+def envyFreenessFlags(prefProfile:PrefProfile, allocation:dict, flags:int=ORDINAL|CARD)->int:
+    """
+    A fused version of isNecessarilyEnvyFree, isNDDEnvyFree, isWeakPDDEnvyFree, isWeakPossiblyEnvyFree
+    and isCardinallyEnvyFree: each agent's view of each bundle (Borda scores, prefix sums and value) is computed once,
+    and all verdicts are derived from them.
+
+    flags: the criteria to check (default: all). The evaluation stops as soon as none of them can hold.
+
+    OUTPUT: the bit flags (bundleVerdicts.NEC, NDD, PDD, POS, CARD) of the criteria satisfied by the given allocation.
+    PDD and POS correspond to the weak variants. CARD is set only if all agents have cardinal utilities.
+
+    >>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[6,5,4,3,2,1]), "Bob":Pref(ordinal=[5,6,3,4,1,2])})
+    >>> envyFreenessFlags(prefProfile, {"Alice":[6,4,2], "Bob":[5,3,1]}) == NEC | NDD | PDD | POS
+    True
+    >>> envyFreenessFlags(prefProfile, {"Alice":[6,3,1], "Bob":[5,4,2]}) == PDD | POS
+    True
+    """
+    for (agent1, pref1) in prefProfile.agentsToPrefs.items():
+        if flags & ORDINAL:
+            bordas = {agent2: pref1.bordasOf(allocation[agent2]) for agent2 in prefProfile.agents}
+            sums = {agent2: list(itertools.accumulate(bordas[agent2])) for agent2 in prefProfile.agents}
+        values = {agent2: pref1.valueOf(allocation[agent2]) for agent2 in prefProfile.agents} \
+            if flags & CARD and pref1.cardinal is not None else None
+        for agent2 in prefProfile.agents:
+            if agent2 == agent1: continue
+            agentFlags = weakRelationFlags(bordas[agent1], sums[agent1], bordas[agent2], sums[agent2], flags) if flags & ORDINAL else 0
+            if values is not None and values[agent1] >= values[agent2]:
+                agentFlags |= CARD
+            flags &= agentFlags
+            if not flags:
+                return flags
+    return flags
+
+
+def existenceFlags(prefProfile:PrefProfile, evaluate=proportionalityFlags, flags:int=ORDINAL|CARD, allocations=None, bundleFilter=None)->int:
+    """
+    An existence query: return the flags of the criteria (among the given flags) for which a satisfying allocation exists.
+
+    evaluate:    a function on a PrefProfile, an allocation and the flags to check, that returns the flags satisfied by the allocation,
+                 e.g. proportionalityFlags or envyFreenessFlags. It may return only the strongest ordinal criterion that holds,
+                 since the weaker ones are implied (see bundleVerdicts.impliedFlags).
+    allocations: the allocations to check (default: all equal partitions, filtered by bundleFilter).
+    bundleFilter: an optional ProportionalBundleFilter, with which the allocations are generated.
+
+    Each criterion is dropped from the flags to check (and from the flags of the bundleFilter) as soon as it is witnessed,
+    either directly or through a stronger criterion that implies it (NEC => NDD => PDD => POS),
+    so the pruning gets stronger as the weaker criteria are witnessed.
+    The criteria witnessed only by implication are counted in bundleVerdicts.implicationCounters.impliedWitnesses.
+    The enumeration stops as soon as all criteria are witnessed.
+
+    >>> prefProfile = PrefProfile({"Alice":Pref(cardinal={6:6,5:5,4:4,3:3,2:2,1:1}), "Bob":Pref(cardinal={6:6,5:5,4:4,3:3,2:2,1:1})})
+    >>> existenceFlags(prefProfile) == PDD | POS    # identical agents cannot both get at least half the value
+    True
+    >>> existenceFlags(prefProfile, envyFreenessFlags) == PDD | POS
+    True
+    >>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[6,5,4,3,2,1]), "Bob":Pref(ordinal=[5,6,3,4,1,2])})
+    >>> existenceFlags(prefProfile, proportionalityFlags, NEC)
+    1
+    >>> existenceFlags(prefProfile, proportionalityFlags, ORDINAL, bundleFilter=ProportionalBundleFilter(prefProfile, ORDINAL)) == ORDINAL
+    True
+    >>> strongestOnly = lambda prefProfile, allocation, flags: proportionalityFlags(prefProfile, allocation, flags) & NEC
+    >>> implicationCounters.reset()
+    >>> existenceFlags(prefProfile, strongestOnly, ORDINAL) == ORDINAL
+    True
+    >>> implicationCounters.impliedWitnesses
+    1
+    """
+    if allocations is None:
+        allocations = equalPartitions(prefProfile.agents, prefProfile.items, bundleFilter)
+    witnessed = 0
+    for allocation in allocations:
+        verdict = evaluate(prefProfile, allocation, flags & ~witnessed)
+        implied = impliedFlags(verdict)
+        if implied & flags & ~(witnessed | verdict):
+            implicationCounters.impliedWitnesses += 1
+        witnessed |= implied
+        if not flags & ~witnessed:
+            break
+        if bundleFilter is not None:
+            bundleFilter.flags = flags & ~witnessed
+    return witnessed & flags
+
+
 if __name__ == "__main__":
     import doctest
     print(doctest.testmod())
@@ -9,63 +9,96 @@ Author: Erel Segai-Halevi
 Date:   2017-02
 """
 
-import numpy as np
 import pandas
 from pandas import DataFrame
 from pandas.tools import plotting
 from itemAssignment import *
+from bundleVerdicts import PDD, POS, implicationCounters
 from collections import OrderedDict
+from VerdictCache import VerdictCache
 from datetime import datetime
 
 import simulations
 
-np.random.seed(1)
+def existenceOfProportionalAllocations(prefProfile):
+	"""
+	OUTPUT (bool,bool,bool,bool): whether NecPR, NDDPR, PDDPR and PosPR allocations exist for the given profile.
+	These depend only on the agents' rankings, so they can be cached (see VerdictCache).
+	"""
+	# NecPR and NDDPR existence are decided in polynomial time:
+	necExists = findNecessarilyProportionalAllocation(prefProfile) is not None
+	nddExists = findNDDProportionalAllocation(prefProfile) is not None
+	if nddExists:   # NDDPR implies PDDPR and PosPR
+		return (necExists, True, True, True)
+
+	criteria = PDD | POS
+	# Agents with identical rankings are interchangeable, so it is enough to check one allocation per permutation of their bundles.
+	# Bundles that fail all remaining criteria for their agent cannot be in a witness, so their completions are pruned:
+	bundleFilter = ProportionalBundleFilter(prefProfile, criteria)
+	allocations = (allocation for (allocation, weight) in
+		symmetricEqualPartitions(prefProfile.agents, prefProfile.items, prefProfile.identicalAgentGroups(), bundleFilter))
+	# Each criterion is checked (and pruned by) only until it is witnessed:
+	flags = existenceFlags(prefProfile, proportionalityFlags, criteria, allocations, bundleFilter)
+	return (necExists, nddExists, bool(flags & PDD), bool(flags & POS))
+
+
+def existenceOfEnvyFreeAllocations(prefProfile):
+	"""
+	OUTPUT (bool,bool,bool,bool): whether NecEF, NDDEF, weak-PDDEF and weak-PosEF allocations exist for the given profile.
+	These depend only on the agents' rankings, like existenceOfProportionalAllocations.
+	"""
+	necExists = findNecessarilyEnvyFreeAllocation(prefProfile) is not None
+	nddExists = findNDDEnvyFreeAllocation(prefProfile) is not None
+	if nddExists:   # NDDEF implies weak-PDDEF and weak-PosEF
+		return (necExists, True, True, True)
+
+	# Agents with identical rankings have identical views of all bundles, so permuting their bundles does not change the verdicts:
+	allocations = (allocation for (allocation, weight) in
+		symmetricEqualPartitions(prefProfile.agents, prefProfile.items, prefProfile.identicalAgentGroups()))
+	flags = existenceFlags(prefProfile, envyFreenessFlags, PDD | POS, allocations)
+	return (necExists, nddExists, bool(flags & PDD), bool(flags & POS))
+
+
+def checkExistence(prefProfile):
+	"""
+	OUTPUT (bool,...): whether NecPR, NDDPR, PDDPR, PosPR, NecEF, NDDEF, weak-PDDEF and weak-PosEF allocations exist for the given profile.
+	It depends only on the agents' rankings, and is invariant to item relabeling and agent permutation,
+	so it can be averaged exactly over all ordinal profiles by simulations.simulateExact.
+
+	>>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[6,5,4,3,2,1]), "Bob":Pref(ordinal=[5,6,3,4,1,2])})
+	>>> checkExistence(prefProfile)
+	(True, True, True, True, True, True, True, True)
+	>>> prefProfile = PrefProfile({"Alice":Pref(ordinal=[4,3,2,1]), "Bob":Pref(ordinal=[4,2,3,1])})
+	>>> checkExistence(prefProfile)
+	(False, False, False, True, False, False, False, True)
+	"""
+	return existenceOfProportionalAllocations(prefProfile) + existenceOfEnvyFreeAllocations(prefProfile)
+
+
+exactColumnNames = (
+	'NecPR exists', 'NDDPR exists', 'PDDPR exists', 'PosPR exists',
+	'NecEF exists', 'NDDEF exists', 'WeakPDDEF exists', 'WeakPosEF exists')
+
+
+verdictCache = VerdictCache()
 
 def checkProportionality(prefProfile):
 	"""
 	OUTPUT (bool,bool):  whether an NDDPR allocation exists for the given profile,
 	and if it exists, whether it is cardinally fair.
 	"""
-	sumNecExists = sumNDDExists = sumNDDExistsFair = sumPDDExists = sumPDDExistsFair = sumPosExists  = sumPosExistsFair = 0
-	for allocation in equalPartitions(prefProfile.agents, prefProfile.items):
-		isNecProp  = isNecessarilyProportional(prefProfile, allocation)
-		isCardProp = isCardinallyProportional(prefProfile, allocation)
-		isNDDProp  = isNDDProportional(prefProfile, allocation)
-		isPDDProp  = isPDDProportional(prefProfile, allocation)
-		isPosProp  = isPossiblyProportional(prefProfile, allocation)
-
-		# Sanity checks:
-		if isNecProp: assert isNDDProp
-		if isNDDProp: assert isPDDProp
-		if isPDDProp: assert isPosProp
-		if isNecProp: assert isCardProp
-		#if isCardProp: assert isPosProp
-
-		# Sums:
-		sumNecExists += isNecProp
-		sumNDDExists += isNDDProp
-		sumNDDExistsFair += (isNDDProp and isCardProp)
-		sumPDDExists += isPDDProp
-		sumPDDExistsFair += (isPDDProp and isCardProp)
-		sumPosExists += isPosProp
-		sumPosExistsFair += (isPosProp and isCardProp)
-
-		if isNecProp: break
+	(necExists, nddExists, pddExists, posExists) = verdictCache.verdicts(prefProfile, existenceOfProportionalAllocations)
 
 	allocation = findABCCBAAllocation(prefProfile)
-	sumABCCBANecProp  = isNecessarilyProportional(prefProfile, allocation)
 	sumABCCBACardProp = isCardinallyProportional(prefProfile, allocation)
-	sumABCCBANDDProp  = isNDDProportional(prefProfile, allocation)
-	sumABCCBAPDDProp  = isPDDProportional(prefProfile, allocation)
-	sumABCCBAPosProp  = isPossiblyProportional(prefProfile, allocation)
-
-	return (sumNecExists>0, \
-			sumNDDExists>0, \
-			sumABCCBACardProp if sumNDDExists>0 else 0, \
-			sumPDDExists>0, \
-			sumABCCBACardProp if sumPDDExists>0 else 0, \
-			sumPosExists>0, \
-			sumABCCBACardProp if sumPosExists>0 else 0, \
+
+	return (necExists, \
+			nddExists, \
+			sumABCCBACardProp if nddExists else 0, \
+			pddExists, \
+			sumABCCBACardProp if pddExists else 0, \
+			posExists, \
+			sumABCCBACardProp if posExists else 0, \
 			sumABCCBACardProp, \
 			prefProfile.countDiminishingDifferences()/prefProfile.agentCount
 			)
@@ -82,10 +115,18 @@ if __name__ == "__main__":
 	agents = [1,2]
 	iterations = 10
 	createResults = False
+	seed = 1      # the experiments' random streams are spawned from this seed
+	workers = 1   # number of processes that check the profiles
+	computeExact = False
+	if computeExact:   # Exact existence probabilities over all ordinal profiles (impartial culture), for small sizes:
+		results = simulations.simulateExact(checkExistence, exactColumnNames, agents, [1,2,3,4], "temporary/exact-"+str(datetime.now()))
+		print(results)
+		simulations.trace(implicationCounters.report())
 	if createResults:
 		filename = "temporary/"+str(datetime.now())
 		(results1, results2) = simulations.simulateTwice(
-			checkProportionality, columnNames, agents, iterations, filename)
+			checkProportionality, columnNames, agents, iterations, filename, seed=seed, workers=workers)
+		simulations.trace(implicationCounters.report())   # the shortcuts of the fused evaluators; counts only this process when workers > 1
 	else:   # Use existing results:
 		# filename = "2agents-1000iters"
 		filename = "2agents-1000iters-scale"
@@ -7,22 +7,21 @@ Author: Erel Segai-Halevi
 Date:   2019-07
 """
 
-import numpy as np
 import pandas
 from pandas import DataFrame
 from pandas.tools import plotting
 from itemAssignment import *
+from bundleVerdicts import EnvyFreenessTables, IncrementalEnvyFreeness, NEC, NDD, PDD, POS, CARD
+from partitions import revolvingDoorPartitions
 from collections import OrderedDict
 from datetime import datetime
 
 import simulations
 
-np.random.seed(1)
 
-
-def checkEnvyFreeness(prefProfile: PrefProfile):
+def checkEnvyFreeness(prefProfile: PrefProfile, rng=None):
     """
-    INPUT: a preference profile.
+    INPUT: a preference profile, and optionally a numpy.random.Generator for the random baseline allocation (see simulations.sampleRandomProfiles).
 
     OUTPUT:  a vector of booleans indicating whether this profile admits various kinds of envy-free allocations.
     #
@@ -40,14 +39,22 @@ def checkEnvyFreeness(prefProfile: PrefProfile):
         sumABCCBA  = sumABCCBAFair  = \
         sumBaseline  = sumBaselineFair  = \
         0
-    for allocation in equalPartitions(prefProfile.agents, prefProfile.items):
-        isCardEF = isCardinallyEnvyFree(prefProfile, allocation)
-        isNecEF = isNecessarilyEnvyFree(prefProfile, allocation)
-        isNDDEF = isNDDEnvyFree(prefProfile, allocation)
+    tables = EnvyFreenessTables(prefProfile)
+    # Consecutive partitions differ by a swap of two items, so only the relations of the two affected agents are updated:
+    tracker = None
+    for (allocation, swap) in revolvingDoorPartitions(prefProfile.agents, prefProfile.items):
+        if swap is None:
+            tracker = IncrementalEnvyFreeness(tables, allocation)
+        else:
+            tracker.update(swap)
+        flags = tracker.flags()
+        isCardEF = bool(flags & CARD)
+        isNecEF = bool(flags & NEC)
+        isNDDEF = bool(flags & NDD)
         # isPDDEF = isPDDEnvyFree(prefProfile, allocation)  # We do not have an efficient algorithm for that!
         # isPosEF = isPossiblyEnvyFree(prefProfile, allocation)  # We do not have an efficient algorithm for that!
-        isWeakPDDEF = isWeakPDDEnvyFree(prefProfile, allocation)  # We do not have an efficient algorithm for that!
-        isWeakPosEF = isWeakPossiblyEnvyFree(prefProfile, allocation)  # We do not have an efficient algorithm for that!
+        isWeakPDDEF = bool(flags & PDD)   # as in isWeakPDDEnvyFree
+        isWeakPosEF = bool(flags & POS)   # as in isWeakPossiblyEnvyFree
 
         # Sanity checks:
         if isNecEF: assert isNDDEF
@@ -82,7 +89,7 @@ def checkEnvyFreeness(prefProfile: PrefProfile):
 
     isBaseline = isABCCBA
     sumBaseline = sumABCCBA
-    Baseline_allocation = findABCRandomAllocation(prefProfile)
+    Baseline_allocation = findABCRandomAllocation(prefProfile, rng)
     isBaselineFair = isCardinallyEnvyFree(prefProfile, Baseline_allocation)
     sumBaselineFair += (sumFair if (isBaseline and isBaselineFair) else 0)
 
@@ -133,10 +140,12 @@ if __name__ == "__main__":
     agents = (1,2,3)
     iterations = 1000
     createResults = False
+    seed = 1      # the experiments' random streams are spawned from this seed
+    workers = 1   # number of processes that check the profiles
     if createResults:
         filename = "temporary/" + str(datetime.now())
         (results1, results2) = simulations.simulateTwice(
-            checkEnvyFreeness, columnNames, agents, iterations, filename)
+            checkEnvyFreeness, columnNames, agents, iterations, filename, seed=seed, workers=workers)
     else:   # Use existing results:
         filename = "3agents-1000iters-ef"
         results1 = pandas.read_csv("results/"+filename+"-noise.csv")
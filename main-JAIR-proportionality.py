@@ -7,22 +7,21 @@ Author: Erel Segai-Halevi
 Date:   2019-07
 """
 
-import numpy as np
 import pandas
 from pandas import DataFrame
 from pandas.tools import plotting
 from itemAssignment import *
+from bundleVerdicts import NEC, NDD, PDD, POS, CARD
+from allocationCounting import countProportionalityCriteria
 from collections import OrderedDict
 from datetime import datetime
 
 import simulations
 
-np.random.seed(1)
 
-
-def checkProportionality(prefProfile: PrefProfile):
+def checkProportionality(prefProfile: PrefProfile, rng=None):
     """
-    INPUT: a preference profile.
+    INPUT: a preference profile, and optionally a numpy.random.Generator for the random baseline allocation (see simulations.sampleRandomProfiles).
 
     OUTPUT:  a vector of booleans indicating whether this profile admits various kinds of proportional allocations.
     #
@@ -30,39 +29,23 @@ def checkProportionality(prefProfile: PrefProfile):
     # >>> checkProportionality(prefProfile)
     # (0, False, 0, 0, False, 0, 0, False, 4, 0, True, 10, 0, True, 0, 0, False, 0, 0, False)
     """
-    sumFair = \
-        sumNecProp = sumNecPropFair = \
-        sumNDDProp = sumNDDPropFair = \
-        sumPDDProp = sumPDDPropFair = \
-        sumPosProp = sumPosPropFair = \
-        sumABCCBA  = sumABCCBAFair  = \
+    sumABCCBA  = sumABCCBAFair  = \
         sumBaseline  = sumBaselineFair  = \
         0
-    for allocation in equalPartitions(prefProfile.agents, prefProfile.items):
-        isCardProp = isCardinallyProportional(prefProfile, allocation)
-        isNecProp = isNecessarilyProportional(prefProfile, allocation)
-        isNDDProp = isNDDProportional(prefProfile, allocation)
-        isPDDProp = isPDDProportional(prefProfile, allocation)
-        isPosProp = isPossiblyProportional(prefProfile, allocation)
-
-        # Sanity checks:
-        if isNecProp: assert isNDDProp
-        if isNDDProp: assert isPDDProp
-        if isPDDProp: assert isPosProp
-        if isNecProp: assert isCardProp
-
-        # Sums:
-        sumFair += isCardProp
-        sumNecProp += isNecProp
-        sumNecPropFair += (isNecProp and isCardProp)
-        sumNDDProp += isNDDProp
-        sumNDDPropFair += (isNDDProp and isCardProp)
-        sumPDDProp += isPDDProp
-        sumPDDPropFair += (isPDDProp and isCardProp)
-        sumPosProp += isPosProp
-        sumPosPropFair += (isPosProp and isCardProp)
-
-
+    counts = countProportionalityCriteria(prefProfile)
+    sumFair = counts[CARD]
+    sumNecProp = counts[NEC]
+    sumNecPropFair = counts[NEC | CARD]
+    sumNDDProp = counts[NDD]
+    sumNDDPropFair = counts[NDD | CARD]
+    sumPDDProp = counts[PDD]
+    sumPDDPropFair = counts[PDD | CARD]
+    sumPosProp = counts[POS]
+    sumPosPropFair = counts[POS | CARD]
+
+    # Sanity checks:
+    assert sumNecProp <= sumNDDProp <= sumPDDProp <= sumPosProp
+    assert sumNecPropFair == sumNecProp
 
     bestItems = prefProfile.bestItems()
     isABCCBA = len(bestItems)==prefProfile.agentCount
@@ -73,7 +56,7 @@ def checkProportionality(prefProfile: PrefProfile):
 
     isBaseline = isABCCBA
     sumBaseline = sumABCCBA
-    Baseline_allocation = findABCRandomAllocation(prefProfile)
+    Baseline_allocation = findABCRandomAllocation(prefProfile, rng)
     isBaselineFair = isCardinallyProportional(prefProfile, Baseline_allocation)
     sumBaselineFair += (sumFair if (isBaseline and isBaselineFair) else 0)
 
@@ -116,10 +99,12 @@ if __name__ == "__main__":
     agents = (1,2,3)
     iterations = 1000
     createResults = False
+    seed = 1      # the experiments' random streams are spawned from this seed
+    workers = 1   # number of processes that check the profiles
     if createResults:
         filename = "temporary/"+str(datetime.now())
         (results1, results2) = simulations.simulateTwice(
-            checkProportionality, columnNames, agents, iterations, filename)
+            checkProportionality, columnNames, agents, iterations, filename, seed=seed, workers=workers)
     else:   # Use existing results:
         # filename = "3agents-1000iters-pr"
         filename = "2agents-1000iters-pr"
@@ -7,14 +7,19 @@ Author: Erel Segai-Halevi
 Date:   2017-02
 """
 
-from itertools import combinations
+from itertools import combinations, islice
+from functools import lru_cache
+from math import comb, factorial
+import random
 
-def equalPartitions(agents:list, items:list):
+def equalPartitions(agents:list, items:list, bundleFilter=None):
     """
     Generates all partitions of 'items' that give each agent in 'agents' an equal number of items.
 
-    INPUT: agents (list), items (list).
-    Currently, at most 3 agents are supported.
+    INPUT: agents (list), items (list). Any number of agents is supported.
+    bundleFilter (optional): a boolean function on an agent and a bundle (list of items).
+       Only partitions in which every agent's bundle passes the filter are generated.
+       The filter is applied as soon as each agent's bundle is chosen, so a rejected bundle prunes all its completions.
 
     OUTPUT: partitions (dictionaries that map agents to item-lists)
 
@@ -123,17 +128,353 @@ def equalPartitions(agents:list, items:list):
     {'A': [6, 5], 'B': [3, 2], 'C': [1, 4]}
     {'A': [6, 5], 'B': [4, 2], 'C': [1, 3]}
     {'A': [6, 5], 'B': [4, 3], 'C': [1, 2]}
+
+    >>> for p in equalPartitions(["A","B"], [1,2,3,4], lambda agent,bundle: agent!="A" or 4 in bundle): pprint(p)
+    {'A': [4, 1], 'B': [2, 3]}
+    {'A': [4, 2], 'B': [1, 3]}
+    {'A': [4, 3], 'B': [1, 2]}
+    >>> len(list(equalPartitions(["A","B","C"], [1,2,3,4,5,6], lambda agent,bundle: agent!="A" or 6 in bundle)))
+    30
     """
     if len(agents) == 1:
-        yield {agents[0]: items}
+        if bundleFilter is None or bundleFilter(agents[0], items):
+            yield {agents[0]: items}
     else:
         quota = len(items) // len(agents)  # items per agent
         for indexes in combinations(range(len(items)), quota):
             remaining_items = items[:]
             selection = [remaining_items.pop(i) for i in reversed(indexes)]
-            for result in equalPartitions(agents[1:], remaining_items):
+            if bundleFilter is not None and not bundleFilter(agents[0], selection):
+                continue
+            for result in equalPartitions(agents[1:], remaining_items, bundleFilter):
+                result[agents[0]] = selection
+                yield result
+
+
+@lru_cache(maxsize=None)
+def revolvingDoorCombinations(n:int, k:int)->tuple:
+    """
+    return all k-subsets of range(n), as sorted tuples, in "revolving door" order:
+    every two consecutive subsets differ by removing a single element and adding a single element.
+
+    >>> revolvingDoorCombinations(4, 2)
+    ((0, 1), (1, 2), (0, 2), (2, 3), (1, 3), (0, 3))
+    """
+    if k == 0:
+        return ((),)
+    if k == n:
+        return (tuple(range(n)),)
+    return revolvingDoorCombinations(n-1, k) + tuple(
+        combination + (n-1,) for combination in reversed(revolvingDoorCombinations(n-1, k-1)))
+
+
+def revolvingDoorPartitions(agents:list, items:list):
+    """
+    Generates all partitions of 'items' that give each agent in 'agents' an equal number of items
+    (the same partitions as equalPartitions, in a different order),
+    such that every two consecutive partitions differ by a swap of a single pair of items between two agents.
+
+    OUTPUT: pairs (partition, swap):
+    * partition is a dictionary that maps agents to item-lists.
+      NOTE: to save time, the same dictionary is updated in place and yielded again; copy it if you need to keep it.
+    * swap is None for the first partition. For the next partitions, it is a tuple (agent1, item1, agent2, item2),
+      meaning that agent1 gave item1 to agent2 and received item2 instead.
+
+    Each agent (except the last one) selects its bundle from a "pool" of the items not taken by the previous agents,
+    using revolvingDoorCombinations over the positions in the pool. When an item in a pool is replaced,
+    the new item takes the position of the old one, so the enumeration of the next agents can continue
+    from where it stopped, in the opposite direction.
+
+    >>> for (p,swap) in revolvingDoorPartitions(["A","B"], [1,2,3,4]): print(p, swap)
+    {'A': [1, 2], 'B': [3, 4]} None
+    {'A': [3, 2], 'B': [1, 4]} ('A', 1, 'B', 3)
+    {'A': [3, 1], 'B': [2, 4]} ('A', 2, 'B', 1)
+    {'A': [3, 4], 'B': [2, 1]} ('A', 1, 'B', 4)
+    {'A': [2, 4], 'B': [3, 1]} ('A', 3, 'B', 2)
+    {'A': [1, 4], 'B': [3, 2]} ('A', 2, 'B', 1)
+
+    >>> canonical = lambda p: tuple(tuple(sorted(p[agent])) for agent in ["A","B","C"])
+    >>> partitions = [canonical(p) for (p,swap) in revolvingDoorPartitions(["A","B","C"], [1,2,3,4,5,6])]
+    >>> len(partitions), set(partitions) == {canonical(p) for p in equalPartitions(["A","B","C"], [1,2,3,4,5,6])}
+    (90, True)
+    """
+    agentCount = len(agents)
+    quota = len(items) // agentCount  # items per agent
+    pools = [list(items)]
+    partition = {}
+    for level in range(agentCount-1):
+        chosen = revolvingDoorCombinations(len(pools[level]), quota)[0]
+        partition[agents[level]] = [pools[level][slot] for slot in chosen]
+        pools.append([item for (slot, item) in enumerate(pools[level]) if slot not in chosen])
+    partition[agents[-1]] = list(pools[-1])
+    if agentCount == 1:
+        yield (partition, None)
+        return
+    directions = [1] * agentCount
+    lastSwap = None
+
+    # The position of each item in each pool and in each bundle, so that every swap takes constant time:
+    slots = [{item: slot for (slot, item) in enumerate(pool)} for pool in pools]
+    positions = [{item: position for (position, item) in enumerate(partition[agent])} for agent in agents]
+
+    def replace(items:list, positionOf:dict, old, new):
+        position = positionOf.pop(old)
+        items[position] = new
+        positionOf[new] = position
+
+    def swapItems(level:int, slotOut:int, slotIn:int):
+        itemOut = pools[level][slotOut]
+        itemIn  = pools[level][slotIn]
+        replace(partition[agents[level]], positions[level], itemOut, itemIn)
+        holder = level + 1   # the next agents' pools contain itemIn, up to the agent that holds it:
+        while True:
+            replace(pools[holder], slots[holder], itemIn, itemOut)
+            if holder == agentCount-1 or itemIn not in slots[holder+1]:
+                break
+            holder += 1
+        replace(partition[agents[holder]], positions[holder], itemIn, itemOut)
+        return (agents[level], itemOut, agents[holder], itemIn)
+
+    def traverse(level:int):
+        nonlocal lastSwap
+        transitions = revolvingDoorTransitions(len(pools[level]), quota, directions[level])
+        directions[level] = -directions[level]
+        if level == agentCount-2:
+            yield
+            for (slotOut, slotIn) in transitions:
+                lastSwap = swapItems(level, slotOut, slotIn)
+                yield
+        else:
+            yield from traverse(level+1)
+            for (slotOut, slotIn) in transitions:
+                lastSwap = swapItems(level, slotOut, slotIn)
+                yield from traverse(level+1)
+
+    for _ in traverse(0):
+        yield (partition, lastSwap)
+
+
+@lru_cache(maxsize=None)
+def revolvingDoorTransitions(n:int, k:int, direction:int)->tuple:
+    """
+    return the pairs (removed element, added element) between consecutive subsets of revolvingDoorCombinations(n,k);
+    if direction is negative, the subsets are traversed in reverse order.
+
+    >>> revolvingDoorTransitions(4, 2, 1)
+    ((0, 2), (1, 0), (0, 3), (2, 1), (1, 0))
+    """
+    sequence = revolvingDoorCombinations(n, k)
+    if direction < 0:
+        sequence = sequence[::-1]
+    return tuple(
+        (next(iter(set(previous) - set(current))), next(iter(set(current) - set(previous))))
+        for (previous, current) in zip(sequence, sequence[1:]))
+
+
+class EqualPartitionIndexer(object):
+    """
+    Random access to the partitions generated by equalPartitions(agents, items), in the same order and the same format.
+    The partitions are numbered 0,...,count-1. This allows, for example,
+    splitting a large enumeration into contiguous ranges that can run in parallel, or sampling partitions uniformly.
+
+    >>> indexer = EqualPartitionIndexer(["A","B","C"], [1,2,3,4,5,6])
+    >>> indexer.count
+    90
+    >>> indexer.unrank(31)
+    {'C': [4, 6], 'B': [5, 1], 'A': [3, 2]}
+    >>> indexer.rank({'A': [3, 2], 'B': [5, 1], 'C': [4, 6]})
+    31
+    >>> list(indexer.range(0, indexer.count)) == list(equalPartitions(["A","B","C"], [1,2,3,4,5,6]))
+    True
+    >>> list(indexer.range(30, 32))
+    [{'C': [5, 6], 'B': [4, 1], 'A': [3, 2]}, {'C': [4, 6], 'B': [5, 1], 'A': [3, 2]}]
+    >>> EqualPartitionIndexer(["A","B","C","D"], list(range(16))).count
+    63063000
+    """
+
+    __slots__ = ("agents", "items", "quota", "counts")
+
+    def __init__(self, agents:list, items:list):
+        self.agents = list(agents)
+        self.items = list(items)
+        self.quota = len(items) // len(agents)  # items per agent
+        # counts[level] is the number of partitions of the items remaining for agents[level:]:
+        self.counts = [1] * (len(agents)+1)
+        for level in reversed(range(len(agents)-1)):
+            self.counts[level] = comb(len(items) - level*self.quota, self.quota) * self.counts[level+1]
+
+    @property
+    def count(self)->int:
+        return self.counts[0]
+
+    def __len__(self):
+        return self.count
+
+    def digits(self, index:int)->list:
+        """
+        return, for each agent except the last one, the rank of its selection among the combinations of its remaining items.
+        """
+        if not 0 <= index < self.count:
+            raise IndexError("partition index {} out of range(0,{})".format(index, self.count))
+        result = []
+        for level in range(len(self.agents)-1):
+            (digit, index) = divmod(index, self.counts[level+1])
+            result.append(digit)
+        return result
+
+    def unrank(self, index:int)->dict:
+        """
+        return the partition number 'index' of equalPartitions(agents, items).
+        """
+        remaining_items = self.items[:]
+        result = {}
+        selections = []
+        for digit in self.digits(index):
+            indexes = unrankCombination(digit, len(remaining_items), self.quota)
+            selections.append([remaining_items.pop(i) for i in reversed(indexes)])
+        result[self.agents[-1]] = remaining_items
+        for (agent, selection) in reversed(list(zip(self.agents, selections))):
+            result[agent] = selection
+        return result
+
+    def rank(self, partition:dict)->int:
+        """
+        return the index of the given partition in equalPartitions(agents, items).
+        """
+        remaining_items = self.items[:]
+        index = 0
+        for level in range(len(self.agents)-1):
+            bundle = set(partition[self.agents[level]])
+            indexes = [i for (i, item) in enumerate(remaining_items) if item in bundle]
+            if len(indexes) != self.quota or len(bundle) != self.quota:
+                raise ValueError("the bundle of {} is not a set of {} remaining items".format(self.agents[level], self.quota))
+            index += rankCombination(indexes, len(remaining_items)) * self.counts[level+1]
+            remaining_items = [item for item in remaining_items if item not in bundle]
+        return index
+
+    def range(self, start:int, stop:int):
+        """
+        Generate the partitions number start,...,stop-1 of equalPartitions(agents, items), in order.
+        Only the first partition is located by unranking; the others are generated consecutively.
+        """
+        (start, stop) = (max(start, 0), min(stop, self.count))
+        if start >= stop:
+            return
+        yield from islice(self._partitionsFrom(self.agents, self.items[:], self.digits(start)), stop-start)
+
+    def _partitionsFrom(self, agents:list, items:list, digits:list):
+        if len(agents) == 1:
+            yield {agents[0]: items}
+            return
+        first = True
+        for indexes in islice(combinations(range(len(items)), self.quota), digits[0], None):
+            remaining_items = items[:]
+            selection = [remaining_items.pop(i) for i in reversed(indexes)]
+            for result in self._partitionsFrom(agents[1:], remaining_items, digits[1:] if first else [0]*len(digits[1:])):
                 result[agents[0]] = selection
                 yield result
+            first = False
+
+    def random(self, rng=None)->dict:
+        """
+        return a partition selected uniformly at random.
+        rng: a numpy.random.Generator. If None, the global state of the 'random' module is used.
+        """
+        index = random.randrange(self.count) if rng is None else int(rng.integers(self.count))
+        return self.unrank(index)
+
+
+def rankCombination(indexes:list, n:int)->int:
+    """
+    return the position of the given sorted k-subset of range(n) in itertools.combinations(range(n), k).
+
+    >>> [rankCombination(c, 4) for c in combinations(range(4), 2)]
+    [0, 1, 2, 3, 4, 5]
+    """
+    k = len(indexes)
+    rank = 0
+    previous = -1
+    for (position, index) in enumerate(indexes):
+        for skipped in range(previous+1, index):
+            rank += comb(n - skipped - 1, k - position - 1)
+        previous = index
+    return rank
+
+
+def unrankCombination(rank:int, n:int, k:int)->tuple:
+    """
+    return the k-subset of range(n) at the given position in itertools.combinations(range(n), k).
+
+    >>> [unrankCombination(r, 4, 2) for r in range(6)] == list(combinations(range(4), 2))
+    True
+    """
+    result = []
+    index = 0
+    for position in range(k):
+        while True:
+            following = comb(n - index - 1, k - position - 1)
+            if rank < following:
+                break
+            rank -= following
+            index += 1
+        result.append(index)
+        index += 1
+    return tuple(result)
+
+
+def symmetricEqualPartitions(agents:list, items:list, groups:list=(), bundleFilter=None):
+    """
+    Like equalPartitions, but agents in the same group are considered interchangeable
+    (e.g. agents with identical rankings, see PrefProfile.identicalAgentGroups).
+    Only one partition is generated for each set of partitions that differ by a permutation of the bundles within groups:
+    the one in which the bundles of each group, in the order of 'agents', have increasing minimum items (in the order of 'items').
+
+    INPUT: agents (list), items (list), groups (a list of lists of agents; agents not in any group are not interchangeable),
+    bundleFilter (optional): a boolean function on an agent and a bundle, as in equalPartitions.
+
+    OUTPUT: pairs (partition, weight), where weight is the number of partitions represented by this partition
+    (the product of the factorials of the group sizes).
+    A count over equalPartitions equals the weighted count over symmetricEqualPartitions,
+    as long as the counted property is invariant to permuting the bundles within each group.
+
+    >>> for (p,weight) in symmetricEqualPartitions(["A","B"], [1,2,3,4], [["A","B"]]): print(p, weight)
+    {'B': [3, 4], 'A': [2, 1]} 2
+    {'B': [2, 4], 'A': [3, 1]} 2
+    {'B': [2, 3], 'A': [4, 1]} 2
+    >>> sum(weight for (p,weight) in symmetricEqualPartitions(["A","B","C"], [1,2,3,4,5,6], [["A","C"]]))
+    90
+    """
+    predecessor = {}
+    weight = 1
+    for group in groups:
+        ordered = [agent for agent in agents if agent in group]
+        predecessor.update(zip(ordered[1:], ordered))
+        weight *= factorial(len(ordered))
+    position = {item: index for (index, item) in enumerate(items)}
+    for partition in _symmetricEqualPartitions(agents, items, predecessor, position, {}, bundleFilter):
+        yield (partition, weight)
+
+
+def _symmetricEqualPartitions(agents:list, items:list, predecessor:dict, position:dict, minimum:dict, bundleFilter):
+    agent = agents[0]
+    if len(agents) == 1:
+        if (agent not in predecessor or position[items[0]] > minimum[predecessor[agent]]) and \
+                (bundleFilter is None or bundleFilter(agent, items)):
+            yield {agent: items}
+        return
+    quota = len(items) // len(agents)  # items per agent
+    for indexes in combinations(range(len(items)), quota):
+        # the remaining items are kept in their original order, so the first index is the minimum item:
+        minimum[agent] = position[items[indexes[0]]]
+        if agent in predecessor and minimum[agent] < minimum[predecessor[agent]]:
+            continue
+        remaining_items = items[:]
+        selection = [remaining_items.pop(i) for i in reversed(indexes)]
+        if bundleFilter is not None and not bundleFilter(agent, selection):
+            continue
+        for result in _symmetricEqualPartitions(agents[1:], remaining_items, predecessor, position, minimum, bundleFilter):
+            result[agent] = selection
+            yield result
 
 
 if __name__ == "__main__":
@@ -0,0 +1,195 @@
+#!python3
+
+"""
+Streaming import of real-world ordinal preferences from PrefLib files (www.preflib.org):
+.soc (strict orders, complete), .soi (strict orders, incomplete) and .toc (orders with ties, complete).
+Both the current format (with "# KEY: value" header lines) and the older format
+(with a candidate count, candidate lines and a voter-count line) are supported.
+
+Each data line contains a multiplicity and a ranking of the items, e.g. "3: 2,1,{3,4}".
+The voters are read one line at a time, so memory use does not depend on the size of the file.
+Items are represented by their numbers in the file (1,...,itemCount).
+In a .soi file, the items that a voter did not rank are appended at the bottom, in increasing order.
+In a .toc file, ties are broken by the order in which the tied items are listed.
+
+Date:   2026-10
+"""
+
+import itertools
+import numpy as np
+from Pref import Pref
+from PrefProfile import PrefProfile
+
+
+def openLines(source):
+    """
+    return an iterator over the lines of the source, which may be a file name or an open text file.
+    """
+    return open(source) if isinstance(source, str) else source
+
+
+def readHeaderAndRankings(lines) -> (dict, "generator"):
+    """
+    Read the header of a PrefLib file, and return (header, rankings).
+    header maps keys (e.g. "NUMBER ALTERNATIVES", "ALTERNATIVE NAME 1") to their values;
+    rankings is a generator of (multiplicity, ranking) pairs, where each ranking is a list of all item numbers.
+
+    >>> data = '''# FILE NAME: example.soi
+    ... # NUMBER ALTERNATIVES: 3
+    ... # ALTERNATIVE NAME 1: x
+    ... # ALTERNATIVE NAME 2: y
+    ... # ALTERNATIVE NAME 3: z
+    ... 2: 2,1,3
+    ... 1: 3
+    ... '''
+    >>> import io
+    >>> (header, rankings) = readHeaderAndRankings(io.StringIO(data))
+    >>> header["NUMBER ALTERNATIVES"], header["ALTERNATIVE NAME 3"]
+    ('3', 'z')
+    >>> list(rankings)
+    [(2, [2, 1, 3]), (1, [3, 1, 2])]
+
+    >>> oldData = '''3
+    ... 1,x
+    ... 2,y
+    ... 3,z
+    ... 3,3,2
+    ... 2,2,{1,3}
+    ... 1,3,1,2
+    ... '''
+    >>> (header, rankings) = readHeaderAndRankings(io.StringIO(oldData))
+    >>> header["NUMBER ALTERNATIVES"], header["ALTERNATIVE NAME 2"]
+    ('3', 'y')
+    >>> list(rankings)
+    [(2, [2, 1, 3]), (1, [3, 1, 2])]
+    """
+    lines = iter(lines)
+    header = {}
+    line = ""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith("#"):
+            break
+        (key, _, value) = line[1:].partition(":")
+        header[key.strip()] = value.strip()
+        line = ""
+    if "NUMBER ALTERNATIVES" not in header:    # old format
+        itemCount = int(line)
+        header["NUMBER ALTERNATIVES"] = line
+        for (item, line) in zip(range(1, itemCount+1), lines):
+            header["ALTERNATIVE NAME {}".format(item)] = line.strip().partition(",")[2]
+        header["NUMBER VOTERS"] = next(lines).strip().split(",")[0]
+        line = ""
+    itemCount = int(header["NUMBER ALTERNATIVES"])
+
+    def rankings():
+        for dataLine in itertools.chain([line], lines):
+            dataLine = dataLine.strip()
+            if dataLine and not dataLine.startswith("#"):
+                yield parseRanking(dataLine, itemCount)
+    return (header, rankings())
+
+
+def parseRanking(line:str, itemCount:int) -> (int, list):
+    """
+    Parse a single data line, in the current format ("count: ranking") or the old format ("count,ranking").
+
+    >>> parseRanking("3: 2,{1,4},3", 4)
+    (3, [2, 1, 4, 3])
+    >>> parseRanking("3,2,{}", 4)
+    (3, [2, 1, 3, 4])
+    """
+    if ":" in line:
+        (count, _, ranking) = line.partition(":")
+    else:
+        (count, _, ranking) = line.partition(",")
+    ranking = ranking.replace("{", ",").replace("}", ",")
+    ranked = [int(item) for item in ranking.split(",") if item.strip()]
+    if len(ranked) < itemCount:
+        rankedSet = set(ranked)
+        ranked += [item for item in range(1, itemCount+1) if item not in rankedSet]
+    return (int(count), ranked)
+
+
+def readVoters(source):
+    """
+    Generate the ranking of each voter in the given PrefLib file, expanding the multiplicities.
+    Each voter gets its own list, so the rankings can be modified independently.
+    The source may be a file name or an open text file.
+
+    >>> import io
+    >>> list(readVoters(io.StringIO("# NUMBER ALTERNATIVES: 2\\n2: 1,2\\n1: 2,1\\n")))
+    [[1, 2], [1, 2], [2, 1]]
+    """
+    lines = openLines(source)
+    try:
+        (header, rankings) = readHeaderAndRankings(lines)
+        for (count, ranking) in rankings:
+            for i in range(count):
+                yield list(ranking)
+    finally:
+        if isinstance(source, str):
+            lines.close()
+
+
+def readProfiles(source, agentsPerProfile:int):
+    """
+    Generate PrefProfile objects, each containing the next 'agentsPerProfile' voters of the given PrefLib file, lazily.
+    The agents are named 0,...,agentsPerProfile-1; the items are the item numbers.
+    Voters that remain at the end of the file (less than agentsPerProfile) are ignored.
+
+    >>> data = "# NUMBER ALTERNATIVES: 4\\n3: 1,2,3,4\\n1: 4,3,2,1\\n1: 2\\n"
+    >>> import io
+    >>> list(readProfiles(io.StringIO(data), 2))
+    [[ ordinal=1>2>3>4,  ordinal=1>2>3>4], [ ordinal=1>2>3>4,  ordinal=4>3>2>1]]
+
+    The voters of a line with a multiplicity are independent, so items can be removed from the profiles:
+
+    >>> profile = next(readProfiles(io.StringIO(data), 2))
+    >>> profile.removeItem(3)
+    >>> profile
+    [ ordinal=1>2>4,  ordinal=1>2>4]
+
+    It can be combined, for example, with the checks in itemAssignment:
+
+    >>> from itemAssignment import isNDDProportional
+    >>> [isNDDProportional(profile, [[1,2],[3,4]]) for profile in readProfiles(io.StringIO(data), 2)]
+    [False, True]
+    """
+    voters = readVoters(source)
+    agents = list(range(agentsPerProfile))
+    while True:
+        rankings = list(itertools.islice(voters, agentsPerProfile))
+        if len(rankings) < agentsPerProfile:
+            return
+        yield PrefProfile({agent: Pref(ordinal=ranking) for (agent, ranking) in zip(agents, rankings)})
+
+
+def readRankingBatches(source, agentsPerProfile:int, batchSize:int):
+    """
+    Generate batches of profiles from the given PrefLib file, as compact rank arrays (see randomProfiles):
+    each batch is an int16 array 'order' of shape (profileCount, agentsPerProfile, itemCount),
+    where order[p,a,r] is the index (0,...,itemCount-1) of the item ranked at place r by agent a in profile p,
+    and profileCount is batchSize, except possibly in the last batch.
+    A batch can be converted to PrefProfile objects by PrefProfile.fromArrays, or saved by ProfileCorpus.save.
+
+    >>> data = "# NUMBER ALTERNATIVES: 3\\n5: 1,2,3\\n2: 3,1,2\\n"
+    >>> import io
+    >>> [batch.tolist() for batch in readRankingBatches(io.StringIO(data), 2, 2)]
+    [[[[0, 1, 2], [0, 1, 2]], [[0, 1, 2], [0, 1, 2]]], [[[0, 1, 2], [2, 0, 1]]]]
+    """
+    voters = readVoters(source)
+    while True:
+        rankings = list(itertools.islice(voters, agentsPerProfile*batchSize))
+        profileCount = len(rankings) // agentsPerProfile
+        if profileCount == 0:
+            return
+        order = np.array(rankings[:profileCount*agentsPerProfile], dtype=np.int16) - 1
+        yield order.reshape(profileCount, agentsPerProfile, -1)
+
+
+if __name__ == "__main__":
+    import doctest
+    print(doctest.testmod())
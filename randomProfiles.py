@@ -0,0 +1,229 @@
+#!python3
+
+"""
+Vectorized generation of many random preference profiles at once.
+
+A batch of profiles is represented by two arrays of shape (count, agentCount, itemCount):
+* values[p,a,i] - the value of item i to agent a in profile p;
+* order[p,a,r]  - the item that agent a ranks at place r (0 = best) in profile p.
+
+Use PrefProfile.fromArrays to convert a single profile of a batch to a PrefProfile.
+
+All samplers accept an optional numpy.random.Generator (rng); if it is None, the global np.random state is used.
+
+Date:   2026-10
+"""
+
+import numpy as np
+
+
+def rankingsOf(values:np.ndarray)->np.ndarray:
+    """
+    return the rankings implied by the given values: for each agent, its items by decreasing value.
+
+    >>> rankingsOf(np.array([[6.2, 1.3, 3.4], [1, 2, 3]]))
+    array([[0, 2, 1],
+           [2, 1, 0]])
+    """
+    return np.argsort(-values, axis=-1, kind="stable")
+
+
+def randomMarketValues(count:int, itemCount:int, lowMarketValue:float, highMarketValue:float, rng:np.random.Generator=None)->np.ndarray:
+    """
+    return an array of shape (count, 1, itemCount) with the market values of the items in each profile,
+    selected uniformly at random from [lowMarketValue, highMarketValue].
+    """
+    rng = np.random if rng is None else rng
+    return rng.uniform(lowMarketValue, highMarketValue, size=(count, 1, itemCount))
+
+
+def randomCardinalBatch(count:int, agentCount:int, itemCount:int,
+                        lowMarketValue:float, highMarketValue:float, maxNoiseSize:float, rng:np.random.Generator=None) -> (np.ndarray, np.ndarray):
+    """
+    The batch version of PrefProfile.randomCardinal:
+    each agent's value for each item is the item's market value plus a uniform noise in [-maxNoiseSize,maxNoiseSize].
+
+    :return (values, order): arrays of shape (count, agentCount, itemCount).
+
+    >>> np.random.seed(1)
+    >>> (values, order) = randomCardinalBatch(1000, 3, 4, 1, 2, 0.5)
+    >>> values.shape, order.shape
+    ((1000, 3, 4), (1000, 3, 4))
+    >>> bool(np.all(np.diff(np.take_along_axis(values, order, axis=-1), axis=-1) <= 0))
+    True
+    >>> bool(np.all(randomCardinalBatch(5, 3, 4, 1, 2, 0.5, rng=np.random.default_rng(7))[0] == randomCardinalBatch(5, 3, 4, 1, 2, 0.5, rng=np.random.default_rng(7))[0]))
+    True
+    """
+    marketValues = randomMarketValues(count, itemCount, lowMarketValue, highMarketValue, rng)
+    rng = np.random if rng is None else rng
+    values = marketValues + rng.uniform(-maxNoiseSize, maxNoiseSize, size=(count, agentCount, itemCount))
+    return (values, rankingsOf(values))
+
+
+def randomCardinalGaussianBatch(count:int, agentCount:int, itemCount:int,
+                                lowMarketValue:float, highMarketValue:float, stddev:float, rng:np.random.Generator=None) -> (np.ndarray, np.ndarray):
+    """
+    The batch version of PrefProfile.randomCardinalGaussian:
+    each agent's value for each item is distributed like Normal(marketValue, stddev).
+
+    :return (values, order): arrays of shape (count, agentCount, itemCount).
+    """
+    marketValues = randomMarketValues(count, itemCount, lowMarketValue, highMarketValue, rng)
+    rng = np.random if rng is None else rng
+    values = marketValues + rng.normal(0, stddev, size=(count, agentCount, itemCount))
+    return (values, rankingsOf(values))
+
+
+def correlatedNoiseBatch(count:int, agentCount:int, itemCount:int,
+                         lowMarketValue:float, highMarketValue:float, stddev:float, correlation:float=0.5, rng:np.random.Generator=None) -> (np.ndarray, np.ndarray):
+    """
+    Like randomCardinalGaussianBatch, but the Gaussian noises of different agents for the same item are correlated:
+    the noise is the sum of an item-specific component shared by all agents and an independent agent-specific component.
+    To use a non-default correlation as a sampler, bind it with functools.partial.
+
+    :param stddev: the standard deviation of the noise of each agent for each item.
+    :param correlation: the correlation between the noises of two agents for the same item (between 0 and 1).
+    :return (values, order): arrays of shape (count, agentCount, itemCount).
+
+    >>> np.random.seed(1)
+    >>> (values, order) = correlatedNoiseBatch(20000, 2, 3, 1, 2, 0.5, correlation=0.8)
+    >>> round(float(np.corrcoef(values[:,0,0], values[:,1,0])[0,1]), 2)   # (0.8*0.25 + 1/12) / (0.25 + 1/12)
+    0.85
+    >>> (values, order) = correlatedNoiseBatch(5, 3, 4, 1, 2, 0.5, correlation=1)
+    >>> bool(np.all(order == order[:,:1,:]))
+    True
+    """
+    if not 0 <= correlation <= 1:
+        raise ValueError("correlation should be between 0 and 1, but it is {}".format(correlation))
+    marketValues = randomMarketValues(count, itemCount, lowMarketValue, highMarketValue, rng)
+    rng = np.random if rng is None else rng
+    commonNoise = rng.normal(0, stddev, size=(count, 1, itemCount))
+    agentNoise = rng.normal(0, stddev, size=(count, agentCount, itemCount))
+    values = marketValues + np.sqrt(correlation)*commonNoise + np.sqrt(1-correlation)*agentNoise
+    return (values, rankingsOf(values))
+
+
+def plackettLuceBatch(count:int, agentCount:int, itemCount:int,
+                      lowMarketValue:float, highMarketValue:float, temperature:float, rng:np.random.Generator=None) -> (None, np.ndarray):
+    """
+    Random rankings from the Plackett-Luce model, where the worth of each item is exp(marketValue/temperature);
+    see plackettLuceRankings.
+
+    :param temperature: 0 means that all agents rank the items by their market value; a large temperature means nearly uniform rankings.
+    :return (None, order): this is an ordinal model, so there are no values; order has shape (count, agentCount, itemCount).
+
+    >>> np.random.seed(1)
+    >>> (values, order) = plackettLuceBatch(4, 3, 5, 1, 2, 0)
+    >>> values is None, order.shape, bool(np.all(order == order[:,:1,:]))
+    (True, (4, 3, 5), True)
+    """
+    marketValues = randomMarketValues(count, itemCount, lowMarketValue, highMarketValue, rng)
+    return (None, plackettLuceRankings(marketValues, agentCount, temperature, rng))
+
+
+def plackettLuceRankings(marketValues:np.ndarray, agentCount:int, temperature:float, rng:np.random.Generator=None)->np.ndarray:
+    """
+    Each agent picks its next-best item with probability proportional to the worths exp(marketValue/temperature) of the remaining items.
+    Uses the Gumbel-max trick: sorting marketValue/temperature + Gumbel noise gives a Plackett-Luce ranking.
+
+    :param marketValues: an array of shape (count, 1, itemCount).
+    :return: an array of rankings of shape (count, agentCount, itemCount).
+
+    >>> np.random.seed(1)
+    >>> order = plackettLuceRankings(np.full((20000, 1, 2), [np.log(3), 0]), 1, 1)
+    >>> round(float(np.mean(order[:,0,0] == 0)), 2)   # probability 3/(3+1)
+    0.75
+    """
+    (count, _, itemCount) = marketValues.shape
+    if temperature == 0:
+        return np.broadcast_to(rankingsOf(marketValues), (count, agentCount, itemCount)).copy()
+    rng = np.random if rng is None else rng
+    utilities = marketValues/temperature + rng.gumbel(size=(count, agentCount, itemCount))
+    return rankingsOf(utilities)
+
+
+def mallowsBatch(count:int, agentCount:int, itemCount:int,
+                 lowMarketValue:float, highMarketValue:float, dispersion:float, rng:np.random.Generator=None) -> (None, np.ndarray):
+    """
+    Random rankings from the Mallows model, centered at the ranking of the items by their market values;
+    see mallowsRankings.
+
+    :param dispersion: between 0 and 1. 0 means that all agents rank the items by their market value; 1 means uniform rankings.
+    :return (None, order): this is an ordinal model, so there are no values; order has shape (count, agentCount, itemCount).
+
+    >>> np.random.seed(1)
+    >>> (values, order) = mallowsBatch(4, 3, 5, 1, 2, 0)
+    >>> values is None, order.shape, bool(np.all(order == order[:,:1,:]))
+    (True, (4, 3, 5), True)
+    """
+    marketValues = randomMarketValues(count, itemCount, lowMarketValue, highMarketValue, rng)
+    return (None, mallowsRankings(rankingsOf(marketValues), agentCount, dispersion, rng))
+
+
+def mallowsRankings(center:np.ndarray, agentCount:int, dispersion:float, rng:np.random.Generator=None)->np.ndarray:
+    """
+    The probability of each ranking is proportional to dispersion^d, where d is its Kendall-tau distance from the center.
+
+    The rankings are sampled by the repeated-insertion method: the i-th item of the center is inserted at distance
+    j<=i above its place with probability proportional to dispersion^j. All the insertion distances are drawn at once;
+    the insertions themselves are done by a loop over the items that is vectorized over all profiles and agents.
+
+    :param center: an array of rankings of shape (count, 1, itemCount).
+    :return: an array of rankings of shape (count, agentCount, itemCount).
+
+    >>> np.random.seed(1)
+    >>> order = mallowsRankings(np.zeros((30000, 1, 3), dtype=int) + [2,0,1], 1, 1)
+    >>> (np.unique(order[:,0,:], axis=0, return_counts=True)[1] / 30000).round(1).tolist()
+    [0.2, 0.2, 0.2, 0.2, 0.2, 0.2]
+    >>> order = mallowsRankings(np.zeros((30000, 1, 2), dtype=int) + [1,0], 1, 0.5)
+    >>> abs(float(np.mean(order[:,0,0] == 1)) - 1/(1+0.5)) < 0.01
+    True
+    """
+    if not 0 <= dispersion <= 1:
+        raise ValueError("dispersion should be between 0 and 1, but it is {}".format(dispersion))
+    (count, _, itemCount) = center.shape
+    shape = (count, agentCount, itemCount)
+
+    # distances[...,i] is the distance by which the i-th item of the center is inserted above its place;
+    # it is a geometric random variable truncated to {0,...,i}.
+    places = np.arange(itemCount)
+    rng = np.random if rng is None else rng
+    uniform = rng.random(shape)
+    if dispersion == 0:
+        distances = np.zeros(shape, dtype=int)
+    elif dispersion == 1:
+        distances = np.floor(uniform * (places + 1)).astype(int)
+    else:
+        distances = np.floor(np.log1p(-uniform * (1 - dispersion**(places + 1))) / np.log(dispersion)).astype(int)
+    distances = np.minimum(distances, places)
+
+    # positions[...,i] is the current place of the i-th item of the center:
+    positions = np.empty(shape, dtype=int)
+    for i in range(itemCount):
+        newPosition = (i - distances[..., i])[..., np.newaxis]
+        previous = positions[..., :i]
+        previous += (previous >= newPosition)
+        positions[..., i] = newPosition[..., 0]
+    return np.take_along_axis(np.broadcast_to(center, shape), np.argsort(positions, axis=-1), axis=-1)
+
+
+def isDiminishingDifferences(values:np.ndarray, order:np.ndarray=None)->np.ndarray:
+    """
+    The vectorized version of Pref.isDiminishingDifferences.
+
+    :param values: an array whose last axis contains the values of the items to a single agent.
+    :param order:  the corresponding rankings (as returned by rankingsOf). If None, they are computed from the values.
+    :return: a boolean array with the shape of values without its last axis.
+
+    >>> isDiminishingDifferences(np.array([[6.2, 1.3, 3.4], [6.2, 0.3, 3.4]]))
+    array([ True, False])
+    """
+    if order is None:
+        order = rankingsOf(values)
+    sortedValues = np.take_along_axis(values, order, axis=-1)
+    return np.all(np.diff(sortedValues, n=2, axis=-1) >= 0, axis=-1)
+
+
+if __name__ == "__main__":
+    import doctest
+    print(doctest.testmod())
@@ -13,15 +13,21 @@ import matplotlib.pyplot as plt
 from partitions import equalPartitions
 import operator
 from timeit import default_timer as timer
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+import inspect
 
 from PrefProfile import PrefProfile
+import randomProfiles
+import exactProfiles
 from mean_and_stderr import mean_and_stderr
 
 trace = lambda *x: None  # To enable tracing, set trace=print
 
 
 def avergeOverRandomProfiles(checkSingleProfile,
-                             agents:list, items:list, lowMarketValue:float, highMarketValue:float, maxNoiseSize:float, iterations:int) -> (list,list):
+                             agents:list, items:list, lowMarketValue:float, highMarketValue:float, maxNoiseSize:float, iterations:int,
+                             sampler=None, rng:np.random.Generator=None) -> (list,list):
     """
     Create many random utility profiles, and calculate various stats on them.
 
@@ -30,6 +36,11 @@ def avergeOverRandomProfiles(checkSingleProfile,
     :param items:  a list of item-names.
     :param lowMarketValue, highMarketValue, maxNoiseSize: used for creating the random valuations.
     :param iterations: number of times to randomize.
+    :param sampler: an optional batch generator from randomProfiles, e.g. randomProfiles.randomCardinalBatch.
+       It is called once with (iterations, agentCount, itemCount, lowMarketValue, highMarketValue, maxNoiseSize),
+       and should return a pair (values, order) of arrays of shape (iterations, agentCount, itemCount); values may be None.
+       If None, each profile is created separately by PrefProfile.randomCardinal.
+    :param rng: the random generator for creating the profiles. If None, the global np.random state is used.
 
     :return (means, stderrs):
         means  is a vector of floats, representing the average of the numbers returned for all random PrefProfiles.
@@ -39,14 +50,102 @@ def avergeOverRandomProfiles(checkSingleProfile,
     >>> dummyCheckSingleProfile = lambda profile: [True,False,5]
     >>> list(avergeOverRandomProfiles(dummyCheckSingleProfile, ["A","B"], ["x","y","z"], 1, 2, 0.5, 10))
     [array([ 1.,  0.,  5.]), array([ 0.,  0.,  0.])]
+
+    >>> countItems = lambda profile: [profile.itemCount, profile.agentCount]
+    >>> (means, stderrs) = avergeOverRandomProfiles(countItems, ["A","B"], ["x","y","z"], 1, 2, 0.5, 10, sampler=randomProfiles.randomCardinalBatch)
+    >>> means.tolist(), stderrs.tolist()
+    ([3.0, 2.0], [0.0, 0.0])
     """
-    generator = lambda: np.array(checkSingleProfile(PrefProfile.randomCardinal(agents, items, lowMarketValue, highMarketValue, maxNoiseSize)))
+    profiles = generateRandomProfiles(agents, items, lowMarketValue, highMarketValue, maxNoiseSize, iterations, sampler, rng)
+    generator = lambda: np.array(checkSingleProfile(next(profiles)))
     return mean_and_stderr(iterations, generator)
 
 
+def generateRandomProfiles(agents:list, items:list, lowMarketValue:float, highMarketValue:float, maxNoiseSize:float, iterations:int,
+                   sampler=None, rng:np.random.Generator=None):
+    """
+    Generate 'iterations' random PrefProfiles, lazily. The parameters are as in avergeOverRandomProfiles.
+    """
+    if sampler is None:
+        for i in range(iterations):
+            yield PrefProfile.randomCardinal(agents, items, lowMarketValue, highMarketValue, maxNoiseSize, rng)
+    else:
+        (values, order) = sampler(iterations, len(agents), len(items), lowMarketValue, highMarketValue, maxNoiseSize, rng=rng)
+        for i in range(iterations):
+            yield PrefProfile.fromArrays(agents, items, values=None if values is None else values[i], order=order[i])
+
+
+def avergeOverCorpus(checkSingleProfile, corpus, start:int=0, stop:int=None) -> (list,list):
+    """
+    Like avergeOverRandomProfiles, but the profiles are read lazily from a ProfileCorpus saved on disk,
+    so the same profiles can be re-evaluated with new checks without regenerating them.
+
+    :param corpus: a ProfileCorpus, or the name of its directory.
+    :param start, stop: the range of profiles to use; default: all of them.
+
+    >>> import tempfile
+    >>> from ProfileCorpus import ProfileCorpus
+    >>> corpus = ProfileCorpus.generate(tempfile.mkdtemp(), randomProfiles.randomCardinalBatch, 10, 2, 3, 1, 2, 0.5)
+    >>> countItems = lambda profile: [profile.itemCount, profile.agentCount]
+    >>> (means, stderrs) = avergeOverCorpus(countItems, corpus.directory, stop=4)
+    >>> means.tolist(), stderrs.tolist()
+    ([3.0, 2.0], [0.0, 0.0])
+    """
+    if isinstance(corpus, str):
+        from ProfileCorpus import ProfileCorpus
+        corpus = ProfileCorpus(corpus)
+    indices = iter(range(len(corpus))[start:stop])
+    generator = lambda: np.array(checkSingleProfile(corpus[next(indices)]))
+    return mean_and_stderr(len(range(len(corpus))[start:stop]), generator)
+
+
+def sampleRandomProfiles(checkSingleProfile,
+                         agents:list, items:list, lowMarketValue:float, highMarketValue:float, maxNoiseSize:float, iterations:int,
+                         sampler, seedSequence:np.random.SeedSequence) -> np.ndarray:
+    """
+    Run checkSingleProfile on 'iterations' random profiles, using an independent random stream derived from the given SeedSequence.
+    If checkSingleProfile accepts an 'rng' argument, the same stream is passed to it,
+    so that random checks (e.g. findABCRandomAllocation) are reproducible as well; the global random states are not changed.
+    The other parameters are as in avergeOverRandomProfiles.
+
+    :return: an array with one row per profile, containing the vector returned by checkSingleProfile.
+
+    >>> countAgents = lambda profile: [profile.agentCount]
+    >>> sampleRandomProfiles(countAgents, ["A","B"], ["x","y"], 1, 2, 0.5, 3, None, np.random.SeedSequence(1)).tolist()
+    [[2], [2], [2]]
+
+    >>> randomDraw = lambda profile, rng=None: [rng.integers(1000)]
+    >>> state = np.random.get_state()[1].tolist()
+    >>> first = sampleRandomProfiles(randomDraw, ["A","B"], ["x","y"], 1, 2, 0.5, 3, None, np.random.SeedSequence(1))
+    >>> np.array_equal(first, sampleRandomProfiles(randomDraw, ["A","B"], ["x","y"], 1, 2, 0.5, 3, None, np.random.SeedSequence(1)))
+    True
+    >>> np.random.get_state()[1].tolist() == state
+    True
+    """
+    rng = np.random.default_rng(seedSequence)
+    profiles = generateRandomProfiles(agents, items, lowMarketValue, highMarketValue, maxNoiseSize, iterations, sampler, rng)
+    if acceptsRng(checkSingleProfile):
+        return np.array([checkSingleProfile(profile, rng=rng) for profile in profiles])
+    return np.array([checkSingleProfile(profile) for profile in profiles])
+
+
+def acceptsRng(function)->bool:
+    """
+    return True iff the given function has a parameter named 'rng'.
+
+    >>> acceptsRng(lambda profile, rng=None: 0), acceptsRng(lambda profile: 0)
+    (True, False)
+    """
+    try:
+        return "rng" in inspect.signature(function).parameters
+    except (TypeError, ValueError):   # e.g. some built-in functions
+        return False
+
+
 def simulate(checkSingleProfile, columnNames:list,
             agents:list, itemCounts:list, noiseSizes:list,
-            lowMarketValue:float, highMarketValue:float, iterations:int, filename:str)->DataFrame:
+            lowMarketValue:float, highMarketValue:float, iterations:int, filename:str, sampler=None,
+            seed=None, workers:int=1)->DataFrame:
     """
     Runs an experiment with random cardinal utility profiles.
 
@@ -59,6 +158,13 @@ def simulate(checkSingleProfile, columnNames:list,
     :param lowMarketValue, highMarketValue: range for randomly selecting the market-value of each item.
     :param iterations: number of iterations to run randomly.
     :param filename:   name of file for saving the results. Will be created in subfolder "results/" with extension "csv".
+    :param sampler:    an optional batch generator of random profiles; see avergeOverRandomProfiles.
+    :param seed:       an int or a SeedSequence. If given, each grid cell gets an independent random stream spawned from SeedSequence(seed),
+       and the cell's iterations are split among 'workers' shards, each with its own child stream.
+       The results are then bit-reproducible for a given (seed, workers), regardless of the process scheduling.
+       If both seed is None and workers==1, the global random state is used, as before.
+    :param workers:    number of worker processes. If larger than 1, checkSingleProfile and sampler must be picklable (e.g. module-level functions).
+       If checkSingleProfile accepts an 'rng' argument, it gets the random stream of its shard (see sampleRandomProfiles).
 
     :return: a DataFrame with the experiment results.
 
@@ -74,35 +180,107 @@ def simulate(checkSingleProfile, columnNames:list,
     3     2.0        10.0         0.7              2.0   1.0   5.0       0.0       0.0
     4     2.0        10.0         0.7              3.0   1.0   5.0       0.0       0.0
     5     2.0        10.0         0.7              4.0   1.0   5.0       0.0       0.0
+
+    >>> countDiminishingDifferences = lambda profile: [profile.countDiminishingDifferences()]
+    >>> results1 = simulate(countDiminishingDifferences, ["DD"], ["A","B"], [2,3], [0.3], 1, 2, 10, "doctest-simulation", seed=1)
+    >>> results2 = simulate(countDiminishingDifferences, ["DD"], ["A","B"], [2,3], [0.3], 1, 2, 10, "doctest-simulation", seed=1)
+    >>> results1.equals(results2)
+    True
     """
     meanColumnNames = list(columnNames)
     stderrColumnNames = [c+" err" for c in columnNames]
     results =  DataFrame(columns=['Agents', 'Iterations', 'Noise size', 'Items per agent'] + meanColumnNames + stderrColumnNames)
     agentCount = len(agents)
-    for maxNoiseSize in noiseSizes:
-        for itemCount in itemCounts:
-            start = timer()
-            trace("noise="+str(maxNoiseSize)+" items="+str(itemCount)+" file="+filename)
-            (means,stderrs) = avergeOverRandomProfiles(checkSingleProfile,
-                agents, range(itemCount * len(agents)),
-                lowMarketValue, highMarketValue, maxNoiseSize, iterations)
-            if len(means)!=len(columnNames):
-                raise ValueError("checkSingleProfile returned {} values, but columnNames has {} values".format(len(means),len(columnNames)))
-            results.loc[len(results)] = [agentCount, iterations, maxNoiseSize, itemCount] + list(means) + list(stderrs)
-            results.to_csv("results/"+filename+".csv")
-            trace("  " + str(timer() - start)+" seconds")
+    useStreams = seed is not None or workers > 1
+    if useStreams:
+        seedSequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        cellSeeds = iter(seedSequence.spawn(len(noiseSizes) * len(itemCounts)))
+    with ExitStack() as stack:
+        pool = stack.enter_context(ProcessPoolExecutor(workers)) if workers > 1 else None
+        for maxNoiseSize in noiseSizes:
+            for itemCount in itemCounts:
+                start = timer()
+                trace("noise="+str(maxNoiseSize)+" items="+str(itemCount)+" file="+filename)
+                items = range(itemCount * len(agents))
+                if useStreams:
+                    shardSizes = [len(shard) for shard in np.array_split(range(iterations), workers)]
+                    shardArguments = [
+                        (checkSingleProfile, agents, items, lowMarketValue, highMarketValue, maxNoiseSize, shardSize, sampler, shardSeed)
+                        for (shardSize, shardSeed) in zip(shardSizes, next(cellSeeds).spawn(workers))]
+                    if pool is None:
+                        shards = [sampleRandomProfiles(*arguments) for arguments in shardArguments]
+                    else:
+                        shards = list(pool.map(sampleRandomProfiles, *zip(*shardArguments)))
+                    samples = iter(np.concatenate([shard for shard in shards if len(shard) > 0]))
+                    (means,stderrs) = mean_and_stderr(iterations, lambda: next(samples).astype(float))
+                else:
+                    (means,stderrs) = avergeOverRandomProfiles(checkSingleProfile,
+                        agents, items,
+                        lowMarketValue, highMarketValue, maxNoiseSize, iterations, sampler)
+                if len(means)!=len(columnNames):
+                    raise ValueError("checkSingleProfile returned {} values, but columnNames has {} values".format(len(means),len(columnNames)))
+                results.loc[len(results)] = [agentCount, iterations, maxNoiseSize, itemCount] + list(means) + list(stderrs)
+                results.to_csv("results/"+filename+".csv")
+                trace("  " + str(timer() - start)+" seconds")
+    return results
+
+
+def simulateExact(checkSingleProfile, columnNames:list,
+                  agents:list, itemCounts:list, filename:str)->DataFrame:
+    """
+    Like simulate, but instead of sampling random cardinal profiles, enumerates all ordinal profiles,
+    up to item relabeling and agent permutation (see exactProfiles), and returns exact averages.
+    The averages are over uniformly-random independent rankings (impartial culture), not over the market-value model of simulate.
+
+    :param checkSingleProfile: a function that takes a single PrefProfile object with ordinal preferences, and returns a vector of numbers describing it.
+       It must be invariant to item relabeling and agent permutation (e.g. existence of NDDPR allocations).
+    :param columnNames: a list of column-names. Should be of the same size as the vector returned by checkSingleProfile.
+    :param agents: a list of agent-names.
+    :param itemCounts: a list of different item-counts (per agent) to try. The enumeration time grows like (m!)^(n-1)/(n-1)! for m items and n agents (see exactProfiles.orbits), so only small sizes are practical.
+    :param filename:   name of file for saving the results. Will be created in subfolder "results/" with extension "csv".
+
+    :return: a DataFrame with the experiment results.
+
+    >>> bestItemsDiffer = lambda profile: [len(profile.bestItems()) == profile.agentCount]
+    >>> simulateExact(bestItemsDiffer, ["Best items differ"], ["A","B"], [1,2], "doctest-simulation")
+       Agents  Orbits  Items per agent  Best items differ
+    0     2.0     2.0              1.0               0.50
+    1     2.0    17.0              2.0               0.75
+    """
+    results =  DataFrame(columns=['Agents', 'Orbits', 'Items per agent'] + list(columnNames))
+    agentCount = len(agents)
+    for itemCount in itemCounts:
+        start = timer()
+        trace("items="+str(itemCount)+" file="+filename)
+        items = list(range(itemCount * agentCount))
+        orbitCount = 0
+        def checkAndCount(profile):
+            nonlocal orbitCount
+            orbitCount += 1
+            return checkSingleProfile(profile)
+        means = exactProfiles.exactAverage(checkAndCount, agents, items)
+        if len(means)!=len(columnNames):
+            raise ValueError("checkSingleProfile returned {} values, but columnNames has {} values".format(len(means),len(columnNames)))
+        results.loc[len(results)] = [agentCount, orbitCount, itemCount] + list(means)
+        results.to_csv("results/"+filename+".csv")
+        trace("  " + str(timer() - start)+" seconds")
     return results
 
 
 
 def simulateTwice(checkSingleProfile, columnNames:list,
-                  agents:list, iterations:int, filename:str)->(DataFrame,DataFrame):
+                  agents:list, iterations:int, filename:str, sampler=None, itemCounts:list=None,
+                  seed:int=None, workers:int=1)->(DataFrame,DataFrame):
     """
     Run two simulation experiments: one with variable noise and one with variable item-count.
 
     :param agents:     a list of agent names.
     :param iterations: number of iterations to randomize.
     :param filename:   base filename for saving the results.
+    :param sampler:    an optional batch generator of random profiles; see avergeOverRandomProfiles.
+    :param itemCounts: the numbers of items per agent in the second experiment.
+       Default: 2..8 for 2 agents, 2..5 for more agents.
+    :param seed, workers: as in simulate. The two experiments get independent random streams, spawned from SeedSequence(seed).
     :return: Two pandas.DataFrame objects, representing the results of two experiments:
        1. Fixed item-count and variable noise (written to file "<filename>-noise.csv"),
        2. Fixed noise and variable item-count (written to file "<filename>-items.csv").
@@ -133,8 +311,15 @@ def simulateTwice(checkSingleProfile, columnNames:list,
     4     2.0        10.0         0.5              6.0   1.0   0.0   5.0       0.0       0.0       0.0
     5     2.0        10.0         0.5              7.0   1.0   0.0   5.0       0.0       0.0       0.0
     6     2.0        10.0         0.5              8.0   1.0   0.0   5.0       0.0       0.0       0.0
+
+    >>> countDiminishingDifferences = lambda profile: [profile.countDiminishingDifferences()]
+    >>> first = simulateTwice(countDiminishingDifferences, ["DD"], ["A","B"], 4, "doctest-simulation", itemCounts=[2], seed=1)
+    >>> second = simulateTwice(countDiminishingDifferences, ["DD"], ["A","B"], 4, "doctest-simulation", itemCounts=[2], seed=1)
+    >>> first[0].equals(second[0]) and first[1].equals(second[1])
+    True
     """
     agentCount = len(agents)
+    (seed1, seed2) = (None, None) if seed is None else np.random.SeedSequence(seed).spawn(2)
 
     fixedItemCount = 5 if agentCount==2 else 4
     results1 = simulate(checkSingleProfile, columnNames,
@@ -145,11 +330,15 @@ def simulateTwice(checkSingleProfile, columnNames:list,
         lowMarketValue=1,
         highMarketValue=2,
         iterations = iterations,
-        filename = filename+"-noise"
+        filename = filename+"-noise",
+        sampler = sampler,
+        seed = seed1,
+        workers = workers
         )
     trace(results1)
 
-    itemCounts = [2,3,4,5,6,7,8]  if agentCount==2 else [2,3,4,5]
+    if itemCounts is None:
+        itemCounts = [2,3,4,5,6,7,8]  if agentCount==2 else [2,3,4,5]
     results2 = simulate(checkSingleProfile, columnNames,
         agents,
         itemCounts = itemCounts,
@@ -158,7 +347,10 @@ def simulateTwice(checkSingleProfile, columnNames:list,
         lowMarketValue=1,
         highMarketValue=2,
         iterations = iterations,
-        filename = filename+"-items"
+        filename = filename+"-items",
+        sampler = sampler,
+        seed = seed2,
+        workers = workers
         )
     trace(results2)
 